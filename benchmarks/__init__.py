@@ -0,0 +1 @@
+"""Benchmarks for pymee. Run with `python -m benchmarks.pipeline`."""
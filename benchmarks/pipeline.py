@@ -0,0 +1,293 @@
+"""Throughput and latency benchmarks for the message pipeline.
+
+Measures on synthetic homes of different sizes:
+- _handle_message throughput per message type (and json decoding)
+- "all" hydration time and peak memory
+- "all" resync (after a reconnect) time and peak memory, with and without stream_all
+- _remap_relationships cost
+- listener dispatch overhead
+- set_value enqueue-to-send latency
+
+Results are written as JSON so they can be compared between releases:
+
+    python -m benchmarks.pipeline --sizes 10 100 1000 5000 --output results.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from pymee import Homee
+from pymee.generator import HomeGenerator
+
+
+class _RecordingSocket:
+    """Stand-in for a websocket that records when messages were sent."""
+
+    def __init__(self) -> None:
+        self.sent: list[float] = []
+
+    async def send(self, msg: str) -> None:
+        self.sent.append(time.perf_counter())
+
+
+class Benchmark:
+    """Collects benchmark results."""
+
+    def __init__(self, budget: float) -> None:
+        """Initialize with the time budget (seconds) per measurement."""
+        self.budget = budget
+        self.results: list[dict] = []
+
+    def record(self, benchmark: str, nodes: int, value: float, unit: str, **extra):
+        """Record a single result."""
+        result = {
+            "benchmark": benchmark,
+            "nodes": nodes,
+            "value": value,
+            "unit": unit,
+            **extra,
+        }
+        self.results.append(result)
+        details = " ".join(f"{k}={v}" for k, v in extra.items())
+        print(
+            f"{benchmark:<28} nodes={nodes:<6} {value:>14.3f} {unit:<8} {details}",
+            file=sys.stderr,
+        )
+
+    async def rate(self, func, messages: list) -> float:
+        """Call the coroutine function with the messages in turn, return calls per second."""
+        count = 0
+        started = time.perf_counter()
+        deadline = started + self.budget
+        while True:
+            await func(messages[count % len(messages)])
+            count += 1
+            if time.perf_counter() >= deadline:
+                break
+        return count / (time.perf_counter() - started)
+
+
+async def _hydrated(data: dict) -> Homee:
+    homee = Homee("127.0.0.1", "benchmark", "benchmark")
+    await homee._handle_message({"all": data})
+    return homee
+
+
+def _attribute_messages(home: HomeGenerator, count: int = 1000) -> list[dict]:
+    return [msg for _, msg in itertools.islice(home.update_stream(), count)]
+
+
+async def bench_handle_message(bench: Benchmark, size: int) -> None:
+    """Measure _handle_message throughput per message type."""
+    home = HomeGenerator(size)
+    data = home.all()
+    homee = await _hydrated(data)
+    nodes = data["nodes"]
+    messages = {
+        "attribute": _attribute_messages(home),
+        "node": [{"node": node} for node in nodes[:100]],
+        "nodes": [{"nodes": nodes[:10]}],
+        "group": [{"group": group} for group in data["groups"][:100]],
+        "relationship": [
+            {"relationship": relationship}
+            for relationship in data["relationships"][:100]
+        ],
+        "warning": [
+            {
+                "warning": {
+                    "code": 100,
+                    "description": "Cube added",
+                    "message": "",
+                    "data": {},
+                }
+            }
+        ],
+    }
+
+    for msg_type, msgs in messages.items():
+        rate = await bench.rate(homee._handle_message, msgs)
+        bench.record("handle_message", size, rate, "msg/s", type=msg_type)
+
+    raw = [json.dumps(msg) for msg in messages["attribute"]]
+    rate = await bench.rate(homee._ws_on_message, raw)
+    bench.record("decode_and_handle", size, rate, "msg/s", type="attribute")
+
+
+async def bench_all_hydration(bench: Benchmark, size: int) -> None:
+    """Measure how long handling the initial 'all' message takes and how much memory it needs."""
+    frame = json.dumps({"all": HomeGenerator(size).all()})
+
+    homee = Homee("127.0.0.1", "benchmark", "benchmark")
+    started = time.perf_counter()
+    await homee._ws_on_message(frame)
+    bench.record(
+        "all_hydration",
+        size,
+        time.perf_counter() - started,
+        "s",
+        frame_bytes=len(frame),
+    )
+
+    homee = Homee("127.0.0.1", "benchmark", "benchmark")
+    tracemalloc.start()
+    await homee._ws_on_message(frame)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    bench.record("all_hydration_peak_memory", size, peak, "bytes")
+
+
+async def bench_all_resync(bench: Benchmark, size: int) -> None:
+    """Measure handling the 'all' message again after a reconnect, with and without stream_all."""
+    frame = json.dumps({"all": HomeGenerator(size).all()})
+
+    for stream_all in (False, True):
+        tracemalloc.start()
+        homee = Homee("127.0.0.1", "benchmark", "benchmark", stream_all=stream_all)
+        await homee._ws_on_message(frame)
+        model, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        await homee._ws_on_message(frame)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        bench.record("all_resync", size, elapsed, "s", stream_all=stream_all)
+        # Memory needed on top of the existing model.
+        bench.record(
+            "all_resync_peak_memory", size, peak - model, "bytes", stream_all=stream_all
+        )
+
+
+async def bench_remap_relationships(bench: Benchmark, size: int) -> None:
+    """Measure the cost of a single _remap_relationships call."""
+    homee = await _hydrated(HomeGenerator(size).all())
+
+    async def remap(_):
+        homee._remap_relationships()
+
+    rate = await bench.rate(remap, [None])
+    bench.record("remap_relationships", size, 1e6 / rate, "us/call")
+
+
+async def bench_listener_dispatch(bench: Benchmark, size: int) -> None:
+    """Measure attribute handling with different numbers of node listeners."""
+    data = HomeGenerator(size).all()
+    homee = await _hydrated(data)
+    node = homee.nodes[-1]
+    attribute = node.attributes[0].raw_data
+    messages = [{"attribute": {**attribute, "current_value": i}} for i in range(100)]
+
+    handles = []
+    for listeners in (0, 1, 10, 100):
+        while len(handles) < listeners:
+            handles.append(node.add_on_changed_listener(lambda node, attr: None))
+        rate = await bench.rate(homee._handle_message, messages)
+        bench.record(
+            "listener_dispatch", size, 1e6 / rate, "us/msg", listeners=listeners
+        )
+
+
+async def bench_set_value_latency(bench: Benchmark, size: int) -> None:
+    """Measure the time between set_value() and the message being sent."""
+    homee = await _hydrated(HomeGenerator(size).all())
+    homee.connected = True
+    ws = _RecordingSocket()
+
+    async def sender():
+        while True:
+            await homee._ws_send_handler(ws)
+
+    task = asyncio.create_task(sender())
+    await asyncio.sleep(0)
+    attribute = homee.nodes[0].attributes[0]
+
+    for mode, burst in (("sequential", 1), ("burst", 100)):
+        latencies = []
+        deadline = time.perf_counter() + bench.budget
+        while time.perf_counter() < deadline:
+            ws.sent.clear()
+            enqueued = []
+            for i in range(burst):
+                enqueued.append(time.perf_counter())
+                await homee.set_value(homee.nodes[0].id, attribute.id, i)
+            while len(ws.sent) < burst:
+                await asyncio.sleep(0)
+            latencies.extend(s - e for s, e in zip(ws.sent, enqueued))
+
+        latencies.sort()
+        bench.record(
+            "set_value_latency",
+            size,
+            statistics.median(latencies) * 1e6,
+            "us",
+            mode=mode,
+            p99=round(latencies[int(len(latencies) * 0.99)] * 1e6, 3),
+            max=round(latencies[-1] * 1e6, 3),
+        )
+
+    task.cancel()
+
+
+BENCHMARKS = {
+    "handle_message": bench_handle_message,
+    "all_hydration": bench_all_hydration,
+    "all_resync": bench_all_resync,
+    "remap_relationships": bench_remap_relationships,
+    "listener_dispatch": bench_listener_dispatch,
+    "set_value_latency": bench_set_value_latency,
+}
+
+
+async def run(sizes: list[int], names: list[str], budget: float) -> dict:
+    """Run the selected benchmarks for all sizes and return the results."""
+    bench = Benchmark(budget)
+    for size in sizes:
+        for name in names:
+            await BENCHMARKS[name](bench, size)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "timestamp": int(time.time()),
+            "budget": budget,
+        },
+        "results": bench.results,
+    }
+
+
+def main() -> None:
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument(
+        "--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS)
+    )
+    parser.add_argument(
+        "--budget", type=float, default=0.5, help="seconds per measurement"
+    )
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    # Keep per message logging out of the measurements.
+    logging.getLogger("pymee").setLevel(logging.WARNING)
+
+    results = asyncio.run(run(args.sizes, args.only, args.budget))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
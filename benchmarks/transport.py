@@ -0,0 +1,143 @@
+"""CPU versus bytes of websocket transport settings on recorded traffic.
+
+Compresses the incoming frames of a recording (see pymee.recording) the way
+homee would with each setting and measures the bytes on the wire, the CPU
+time spent decompressing them on the client and the CPU time spent in
+json decoding. Without a recording, a generated installation and its update
+stream are used:
+
+    python -m benchmarks.transport --recording traffic.rec.gz --output results.json
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import platform
+import sys
+import time
+
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.frames import Frame, Opcode
+
+from pymee.generator import HomeGenerator
+from pymee.recording import INCOMING, read_recording
+from pymee.transport import TransportConfig
+
+from .pipeline import Benchmark
+
+SETTINGS = {
+    "uncompressed": TransportConfig(compression=False),
+    "deflate": TransportConfig(),
+    "deflate_no_context_takeover": TransportConfig(no_context_takeover=True),
+    "deflate_12_bits": TransportConfig(max_window_bits=12),
+    "deflate_9_bits": TransportConfig(max_window_bits=9),
+}
+
+
+def _generated_frames(nodes: int, updates: int) -> list[str]:
+    home = HomeGenerator(nodes)
+    frames = [json.dumps({"all": home.all()})]
+    frames.extend(
+        json.dumps(msg) for _, msg in itertools.islice(home.update_stream(), updates)
+    )
+    return frames
+
+
+def _node_count(frames: list[str]) -> int:
+    """Return the number of nodes in the first 'all' message of the traffic."""
+    for frame in frames:
+        if frame.startswith('{"all"'):
+            return len(json.loads(frame)["all"]["nodes"])
+    return 0
+
+
+def _extensions(config: TransportConfig) -> tuple[PerMessageDeflate, PerMessageDeflate]:
+    """Return the (homee side, client side) extensions negotiated for config."""
+    bits = config.max_window_bits or 15
+    takeover = config.no_context_takeover
+    server = PerMessageDeflate(False, takeover, 15, bits)
+    client = PerMessageDeflate(takeover, False, bits, 15)
+    return server, client
+
+
+def bench_setting(bench: Benchmark, name: str, config: TransportConfig, frames):
+    """Measure one transport setting."""
+    payloads = [frame.encode("utf-8") for frame in frames]
+    raw = sum(len(payload) for payload in payloads)
+
+    if not config.compression:
+        encoded = [Frame(Opcode.TEXT, payload) for payload in payloads]
+        decode_time = 0.0
+    else:
+        server, client = _extensions(config)
+        encoded = [server.encode(Frame(Opcode.TEXT, payload)) for payload in payloads]
+        started = time.process_time()
+        for frame in encoded:
+            client.decode(frame, max_size=None)
+        decode_time = time.process_time() - started
+
+    wire = sum(len(frame.data) for frame in encoded)
+    started = time.process_time()
+    for payload in payloads:
+        json.loads(payload)
+    parse_time = time.process_time() - started
+
+    nodes = _node_count(frames)
+    bench.record(
+        "transport_bytes", nodes, wire, "bytes", setting=name, frames=len(frames)
+    )
+    bench.record("transport_raw_bytes", nodes, raw, "bytes", setting=name)
+    bench.record(
+        "transport_ratio", nodes, wire / raw if raw else 0.0, "ratio", setting=name
+    )
+    bench.record("transport_decompress_cpu", nodes, decode_time, "s", setting=name)
+    bench.record("transport_json_cpu", nodes, parse_time, "s", setting=name)
+
+
+def main() -> None:
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recording", help="recording made with pymee.recording")
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--updates", type=int, default=10000)
+    parser.add_argument(
+        "--only", nargs="+", choices=list(SETTINGS), default=list(SETTINGS)
+    )
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    logging.getLogger("pymee").setLevel(logging.WARNING)
+
+    if args.recording:
+        frames = [
+            frame.data
+            for frame in read_recording(args.recording)
+            if frame.direction == INCOMING
+        ]
+    else:
+        frames = _generated_frames(args.nodes, args.updates)
+
+    bench = Benchmark(0)
+    for name in args.only:
+        bench_setting(bench, name, SETTINGS[name], frames)
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "timestamp": int(time.time()),
+            "source": args.recording or f"generated:{args.nodes}:{args.updates}",
+        },
+        "results": bench.results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
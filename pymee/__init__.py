@@ -1,18 +1,26 @@
 """Library for interacting with the homee smart home/home automation platform."""
 
 import asyncio
+import contextlib
+from collections.abc import Callable, Iterable
 from datetime import datetime
 import hashlib
 import json
 import logging
 import re
+import time
 
 import aiohttp
 import aiohttp.client_exceptions
 from aiohttp.helpers import BasicAuth
 import websockets
 
+from .batch import AttributeUpdateBatcher
+from .commands import CommandTracker, PendingCommand, protocol_name
 from .const import DeviceApp, DeviceOS, DeviceType
+from .events import EventFilter, EventStream, HomeeEvent, OverflowPolicy
+from .lag import LoopLagMonitor, log_lag_spike
+from .metrics import HomeeMetrics
 from .model import (
     HomeeDevice,
     HomeeGroup,
@@ -22,9 +30,32 @@ from .model import (
     HomeeUser,
     HomeeWarning,
 )
+from .offload import ExecutorMode, OffloadedListener, Offloader
+from .outbound import (
+    ClosePolicy,
+    Outbox,
+    Priority,
+    PriorityMessageQueue,
+    RateLimiter,
+)
+from .profiling import (
+    STAGE_LISTENER,
+    STAGE_MODEL,
+    STAGE_ON_ATTRIBUTE_UPDATED,
+    STAGE_ON_MESSAGE,
+    CallbackProfiler,
+)
+from .reconnect import ReconnectPolicy, connect_limiter
+from .streaming import AllMessageParser, is_all_message
+from .subscription import AttributeSubscription, SubscriptionMode
+from .timer import TimerWheel
+from .transport import TransportConfig
 
 _LOGGER = logging.getLogger(__name__)
 
+# Messages about a node, i.e. PUT:/nodes/5/attributes/7?target_value=1
+_NODE_MESSAGE = re.compile(r"[A-Z]+:/?nodes/(\d+)")
+
 
 class Homee:
     """Representation of a Homee system."""
@@ -38,18 +69,90 @@ class Homee:
         ping_interval: int = 30,
         reconnect_interval: int = 5,
         reconnect: bool = True,
-        max_retries: int = 5,
+        max_retries: int | None = 5,
+        batch_window: float | None = None,
+        batch_size: int = 500,
+        session: aiohttp.ClientSession | None = None,
+        timer_wheel: TimerWheel | None = None,
+        offloader: Offloader | None = None,
+        reconnect_policy: ReconnectPolicy | None = None,
+        port: int = 7681,
+        metrics: bool = False,
+        profiler: CallbackProfiler | None = None,
+        lag_interval: float | None = None,
+        lag_threshold: float = 0.1,
+        max_missed_pongs: int = 2,
+        transport: TransportConfig | None = None,
+        stream_all: bool = False,
+        outbox: Outbox | None = None,
+        rate_limiter: RateLimiter | None = None,
+        pong_timeout: float = 10,
     ) -> None:
-        """Initialize the virtual Homee."""
+        """Initialize the virtual Homee.
+
+        If batch_window is set, attribute updates are additionally collected for
+        up to batch_window seconds (or batch_size attributes) and passed to
+        on_attributes_updated() as one list.
+
+        Without a reconnect_policy, reconnects use exponential backoff with jitter
+        starting at reconnect_interval and give up after max_retries
+        (None retries forever).
+
+        session, timer_wheel and offloader can be passed to share them between
+        several instances. A shared session is never closed by Homee.
+
+        With metrics=True, message counts, latencies and connection state are
+        recorded in self.metrics and can be rendered with self.metrics.render().
+
+        With a profiler, the model update, node listeners, on_attribute_updated()
+        and on_message() are timed for every message and slow calls are logged.
+
+        With a lag_interval, the event loop lag is sampled every lag_interval
+        seconds while run() is running, and lags above lag_threshold seconds
+        are logged and passed to on_loop_lag().
+
+        Every ping_interval seconds a ping is sent and its round trip time is
+        recorded. A ping that is not answered within pong_timeout seconds (at
+        most ping_interval) is repeated right away. If max_missed_pongs pings
+        in a row are not answered, the connection is considered dead and
+        reconnected with the usual backoff. Use ping_interval=None to disable
+        the heartbeat.
+
+        transport configures compression and the buffer limits of the websocket.
+
+        With stream_all=True, the 'all' message is decoded and applied one node
+        at a time instead of being decoded completely first, which keeps the
+        memory peak low for large installations, especially when updating
+        existing nodes after a reconnect.
+
+        With an outbox, messages sent while disconnected are kept and sent in
+        order once the next 'all' message after reconnecting has been handled,
+        instead of being discarded.
+
+        With a rate_limiter, queued messages are sent no faster than it allows.
+        """
         self.host = host
+        self.port = port
         self.user = user
         self.password = password
 
         self.device = device
         self.ping_interval = ping_interval
+        self.max_missed_pongs = max_missed_pongs
+        self.pong_timeout = pong_timeout
+        # Round trip time of the last answered ping in seconds.
+        self.ping_rtt: float | None = None
+        self.transport = transport if transport is not None else TransportConfig()
+        self.stream_all = stream_all
+        self.outbox = outbox
+        self.rate_limiter = rate_limiter
         self.should_reconnect = reconnect
         self.reconnect_interval = reconnect_interval
         self.max_retries = max_retries
+        self.reconnect_policy = reconnect_policy or ReconnectPolicy(
+            initial_delay=reconnect_interval, max_retries=max_retries
+        )
+        self.session = session
 
         self.device_id = str(device).lower().replace(" ", "-")
 
@@ -66,9 +169,55 @@ class Homee:
         self.retries = 0
         self.should_close = False
 
-        self._message_queue = asyncio.Queue()
+        self._message_queue = PriorityMessageQueue()
+        # When the reserved message started waiting for the rate limiter.
+        self._throttle_started: float = None
+        # Nodes by id for the rate limiter, rebuilt when self.nodes changes.
+        self._node_table: dict[int, HomeeNode] = {}
+        self._node_table_source: tuple[list[HomeeNode], int] = (None, 0)
         self._connected_event = asyncio.Event()
         self._disconnected_event = asyncio.Event()
+        # Set by disconnect() and close() to wake up run() right away.
+        self._close_event = asyncio.Event()
+        self._close_policy = ClosePolicy.DROP
+        self._close_deadline: float = None
+        # Set while run() is not running.
+        self._stopped_event = asyncio.Event()
+        self._stopped_event.set()
+        # The run() task started by async with.
+        self._run_task: asyncio.Task = None
+
+        # Shared by all rate controlled subscriptions of this instance.
+        self.timer_wheel = timer_wheel if timer_wheel is not None else TimerWheel()
+        self._event_streams: dict[EventStream, None] = {}
+        # Thread and process pools for offloaded listeners, created on first use.
+        self.offloader = offloader if offloader is not None else Offloader()
+        # A shared offloader (i.e. of HomeeManager) is shut down by its owner.
+        self._owns_offloader = offloader is None
+        self._attribute_batcher: AttributeUpdateBatcher = None
+        if batch_window:
+            self._attribute_batcher = AttributeUpdateBatcher(
+                self.on_attributes_updated, self.timer_wheel, batch_window, batch_size
+            )
+        self.metrics: HomeeMetrics = HomeeMetrics(self) if metrics else None
+        self.profiler = profiler
+        self.lag_monitor: LoopLagMonitor = None
+        # A monitor assigned from outside (i.e. shared by HomeeManager) is run by its owner.
+        self._owns_lag_monitor = bool(lag_interval)
+        if lag_interval:
+            self.lag_monitor = LoopLagMonitor(lag_interval, lag_threshold)
+            if self.metrics is not None:
+                self.lag_monitor.observer = self.metrics.loop_lag.observe
+        # set_value() commands waiting for homee to report their target value.
+        self.commands = CommandTracker(
+            self.timer_wheel, self._on_command_confirmed, self._on_command_timeout
+        )
+        # Hooks called from timers, referenced until they are done.
+        self._hook_tasks: set[asyncio.Task] = set()
+        # Called with (node, listener, seconds) after every node listener if set.
+        self._listener_observer: Callable = (
+            self._observe_listener if metrics or profiler is not None else None
+        )
 
     async def get_access_token(self):
         """Try asynchronously to get an access token from homee using username and password."""
@@ -77,7 +226,9 @@ class Homee:
         if self.token is not None and self.expires > datetime.now().timestamp():
             return self.token
 
-        client = aiohttp.ClientSession()
+        # Use the shared session if there is one, otherwise a short lived one.
+        owns_client = self.session is None
+        client = aiohttp.ClientSession() if owns_client else self.session
         auth = BasicAuth(
             self.user, hashlib.sha512(self.password.encode("utf-8")).hexdigest()
         )
@@ -96,24 +247,31 @@ class Homee:
                 url, auth=auth, data=data, headers=headers, timeout=5
             )
         except aiohttp.client_exceptions.ClientError as e:
-            await client.close()
+            if owns_client:
+                await client.close()
             raise AuthenticationFailedException from e
 
         try:
             req_text = await req.text()
             regex = r"^access_token=([0-z]+)&.*&expires=(\d+)$"
             matches = re.match(regex, req_text)
+            if matches is None:
+                if owns_client:
+                    await client.close()
+                raise AuthenticationFailedException(
+                    f"Unexpected access token response ({req.status})"
+                )
 
             self.token = matches[1]
             self.expires = datetime.now().timestamp() + int(matches[2])
 
-            self.retries = 0
-
         except aiohttp.client_exceptions.ClientError as e:
-            await client.close()
+            if owns_client:
+                await client.close()
             raise AuthenticationFailedException from e
 
-        await client.close()
+        if owns_client:
+            await client.close()
         return self.token
 
     async def run(self):
@@ -123,36 +281,60 @@ class Homee:
         """
 
         self.should_close = False
-        initial_connect = True
-
-        # Reconnect loop to avoid recursive reconnects
-        while initial_connect or (
-            not self.should_close
-            and self.should_reconnect
-            and self.retries < self.max_retries
-        ):
-            initial_connect = False
-
-            # Sleep after reconnect
-            if self.retries > 0:
-                await asyncio.sleep(self.reconnect_interval * self.retries)
-                _LOGGER.info(
-                    "Attempting to reconnect in %s seconds",
-                    self.reconnect_interval * self.retries,
-                )
+        self._close_event.clear()
+        self._close_policy = ClosePolicy.DROP
+        self._close_deadline = None
+        self._stopped_event.clear()
+        lag_task = None
+        if self._owns_lag_monitor:
+            lag_task = asyncio.create_task(self.lag_monitor.run(self._on_lag_spike))
 
-            try:
-                await self.get_access_token()
-            except AuthenticationFailedException:
-                # Reconnect
-                self.retries += 1
-                continue
-
-            await self.open_ws()
-
-        # Handle max retries
-        if self.retries >= self.max_retries:
-            await self.on_max_retries()
+        try:
+            initial_connect = True
+
+            # Reconnect loop to avoid recursive reconnects
+            while initial_connect or (
+                not self.should_close
+                and self.should_reconnect
+                and self.reconnect_policy.should_retry(self.retries)
+            ):
+                initial_connect = False
+
+                # Sleep after reconnect
+                if self.retries > 0:
+                    delay = self.reconnect_policy.delay(self.retries)
+                    _LOGGER.info("Attempting to reconnect in %.1f seconds", delay)
+                    with contextlib.suppress(TimeoutError):
+                        await asyncio.wait_for(self._close_event.wait(), delay)
+                    if self.should_close:
+                        break
+                    if self.metrics is not None:
+                        self.metrics.reconnects.inc()
+
+                try:
+                    async with connect_limiter.slot():
+                        started = time.perf_counter()
+                        await self.get_access_token()
+                        if self.metrics is not None:
+                            self.metrics.auth_seconds.observe(
+                                time.perf_counter() - started
+                            )
+                except AuthenticationFailedException:
+                    # Reconnect
+                    self.retries += 1
+                    continue
+
+                if self.should_close:
+                    break
+                await self.open_ws()
+
+            # Handle max retries
+            if not self.reconnect_policy.should_retry(self.retries):
+                await self.on_max_retries()
+        finally:
+            if lag_task is not None:
+                lag_task.cancel()
+            self._stopped_event.set()
 
     def start(self):
         """Wrap run() with asyncio.create_task() and returns the resulting task."""
@@ -170,10 +352,21 @@ class Homee:
             await self.on_reconnect()
 
         try:
-            async with websockets.connect(
-                uri=f"{self.ws_url}/connection?access_token={self.token}",
-                subprotocols=["v2"],
-            ) as ws:
+            # Only the handshake counts against the process wide connect limit.
+            async with connect_limiter.slot():
+                ws = await websockets.connect(
+                    uri=f"{self.ws_url}/connection?access_token={self.token}",
+                    subprotocols=["v2"],
+                    **self.transport.connect_kwargs(),
+                    # Our own heartbeat replaces the keepalive pings of websockets.
+                    **({"ping_interval": None} if self.ping_interval else {}),
+                )
+
+            heartbeat = None
+            closing = asyncio.ensure_future(self._close_event.wait())
+            try:
+                if self.ping_interval:
+                    heartbeat = asyncio.create_task(self._ws_heartbeat(ws))
                 await self._ws_on_open()
 
                 while (not self.should_close) and self.connected:
@@ -183,7 +376,7 @@ class Homee:
                         )
                         send_task = asyncio.ensure_future(self._ws_send_handler(ws))
                         done, pending = await asyncio.wait(
-                            [receive_task, send_task],
+                            [receive_task, send_task, closing],
                             return_when=asyncio.FIRST_COMPLETED,
                         )
 
@@ -191,10 +384,13 @@ class Homee:
 
                         # Kill pending tasks
                         for task in pending:
-                            task.cancel()
+                            if task is not closing:
+                                task.cancel()
 
                         # Check if we finished with an exception
-                        exceptions.extend(task.exception() for task in done)
+                        exceptions.extend(
+                            task.exception() for task in done if task is not closing
+                        )
 
                         if exceptions and exceptions[0] is not None:
                             raise exceptions[0]
@@ -202,6 +398,13 @@ class Homee:
                     except websockets.exceptions.ConnectionClosedError as e:
                         self.connected = False
                         await self.on_disconnected(e)
+            finally:
+                closing.cancel()
+                if heartbeat is not None:
+                    heartbeat.cancel()
+                if self.should_close and self._close_policy == ClosePolicy.FLUSH:
+                    await self._flush_message_queue(ws)
+                await self._close_ws(ws)
         except websockets.exceptions.WebSocketException as e:
             await self._ws_on_error(e)
         except TimeoutError:
@@ -212,6 +415,58 @@ class Homee:
         self.retries += 1
         await self._ws_on_close()
 
+    def _close_time_left(self) -> float | None:
+        """Return the seconds left until the close() deadline, None without one."""
+        if self._close_deadline is None:
+            return None
+        return max(0.0, self._close_deadline - time.monotonic())
+
+    async def _flush_message_queue(self, ws: websockets.WebSocketClientProtocol):
+        """Send the queued messages before closing, until the deadline."""
+
+        async def flush():
+            while not self._message_queue.empty():
+                await self._ws_send(ws, self._message_queue.get_nowait())
+
+        try:
+            await asyncio.wait_for(flush(), self._close_time_left())
+        except TimeoutError:
+            _LOGGER.info(
+                "Homee %s could not send %s queued messages before closing",
+                self.device,
+                self._message_queue.qsize(),
+            )
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        self._drop_message_queue()
+
+    def _drop_message_queue(self) -> int:
+        """Discard all queued messages and return how many there were."""
+        dropped = 0
+        while not self._message_queue.empty():
+            self._message_queue.get_nowait()
+            dropped += 1
+        self._throttle_started = None
+        return dropped
+
+    async def _close_ws(self, ws: websockets.WebSocketClientProtocol):
+        """Close the websocket, abort the connection if the close() deadline passes."""
+        # Reading pauses once max_queue messages are waiting, then the close
+        # frame of homee is never seen. Messages received now are discarded.
+        discard = asyncio.ensure_future(self._ws_discard_messages(ws))
+        try:
+            await asyncio.wait_for(ws.close(), self._close_time_left())
+        except TimeoutError:
+            _LOGGER.info("Homee %s did not close in time, aborting", self.device)
+            ws.transport.abort()
+        finally:
+            discard.cancel()
+
+    async def _ws_discard_messages(self, ws: websockets.WebSocketClientProtocol):
+        with contextlib.suppress(websockets.exceptions.ConnectionClosed):
+            while True:
+                await ws.recv()
+
     async def _ws_receive_handler(self, ws: websockets.WebSocketClientProtocol):
         try:
             msg = await ws.recv()
@@ -225,30 +480,145 @@ class Homee:
 
     async def _ws_send_handler(self, ws: websockets.WebSocketClientProtocol):
         try:
-            msg = await self._message_queue.get()
-            if self.connected and not self.should_close:
-                await ws.send(msg)
+            if self.rate_limiter is not None:
+                msg = await self._throttle()
+            else:
+                msg = await self._message_queue.get()
+            if self.connected and (
+                not self.should_close or self._close_policy == ClosePolicy.FLUSH
+            ):
+                await self._ws_send(ws, msg)
         except websockets.exceptions.ConnectionClosed as e:
             if not self.should_close:
                 self.connected = False
                 raise e
 
+    async def _ws_send(self, ws: websockets.WebSocketClientProtocol, msg: str):
+        """Write a message to the websocket."""
+        await ws.send(msg)
+        if self.metrics is not None:
+            self.metrics.observe_sent(msg)
+
+    async def _throttle(self) -> str:
+        """Wait until the rate limiter allows sending the next queued message and return it.
+
+        The message is reserved in the queue meanwhile. The send handler is
+        cancelled whenever a message arrives, then the next call continues to
+        wait for the same message, so the budget is charged to the message
+        that is sent and the whole wait is recorded.
+        """
+        await self._message_queue.wait()
+        msg = self._message_queue.reserve()
+        protocol = None
+        if self.rate_limiter.protocol_buckets:
+            match = _NODE_MESSAGE.match(msg)
+            protocol = self._node_protocol(int(match.group(1))) if match else None
+
+        while (delay := self.rate_limiter.delay(protocol)) > 0:
+            if self._throttle_started is None:
+                self._throttle_started = time.monotonic()
+            await asyncio.sleep(delay)
+
+        waited = 0.0
+        if self._throttle_started is not None:
+            waited = time.monotonic() - self._throttle_started
+            self._throttle_started = None
+        self.rate_limiter.take(protocol, waited)
+        if self.metrics is not None:
+            self.metrics.throttle_seconds.observe(waited)
+            if waited:
+                self.metrics.throttled_messages.inc()
+        return self._message_queue.get_nowait()
+
+    def _node_protocol(self, node_id: int) -> int | None:
+        """Return the protocol of a node without scanning all nodes per message."""
+        source, count = self._node_table_source
+        # Nodes are only ever added, or replaced by a new list.
+        if source is not self.nodes or count != len(self.nodes):
+            self._node_table = {node.id: node for node in self.nodes}
+            self._node_table_source = (self.nodes, len(self.nodes))
+        node = self._node_table.get(node_id)
+        return node.protocol if node is not None else None
+
+    async def _ws_heartbeat(self, ws: websockets.WebSocketClientProtocol):
+        """Ping homee periodically and drop the connection if pongs stop coming."""
+        loop = asyncio.get_running_loop()
+        timeout = min(self.pong_timeout, self.ping_interval)
+        missed = 0
+        next_ping = loop.time() + self.ping_interval
+        while True:
+            await asyncio.sleep(max(0.0, next_ping - loop.time()))
+            # Pings follow a fixed schedule, waiting for a pong doesn't delay it.
+            next_ping = loop.time() + self.ping_interval
+            started = time.perf_counter()
+            try:
+                pong = await ws.ping()
+                await asyncio.wait_for(pong, timeout)
+            except TimeoutError:
+                missed += 1
+                if self.metrics is not None:
+                    self.metrics.missed_pongs.inc()
+                _LOGGER.info("Homee %s missed %s pongs", self.device, missed)
+                if missed >= self.max_missed_pongs:
+                    _LOGGER.warning(
+                        "Homee %s did not answer %s pings, reconnecting",
+                        self.device,
+                        missed,
+                    )
+                    # Closing gracefully would wait for the dead peer.
+                    ws.transport.abort()
+                    return
+                # Probe again right away instead of waiting for the next ping.
+                next_ping = loop.time()
+                continue
+            except websockets.exceptions.ConnectionClosed:
+                return
+
+            missed = 0
+            self.ping_rtt = time.perf_counter() - started
+            if self.metrics is not None:
+                self.metrics.ping_rtt.observe(self.ping_rtt)
+
     async def _ws_on_open(self):
         """Websocket on_open callback."""
 
         _LOGGER.info("Connection to websocket successfull")
 
         self.connected = True
+        if self.metrics is not None:
+            self.metrics.connected_since = time.monotonic()
 
         await self.on_connected()
-        self.retries = 0
 
-        await self.send("GET:all")
+        await self.send("GET:all", priority=Priority.BACKGROUND)
+
+    def _decode_message(self, msg: str) -> dict:
+        """Decode a message, 'all' messages are parsed while handling them if stream_all is set."""
+        if self.stream_all and isinstance(msg, str) and is_all_message(msg):
+            return {"all": AllMessageParser(msg)}
+        return json.loads(msg)
 
     async def _ws_on_message(self, msg: str):
         """Websocket on_message callback."""
 
-        await self._handle_message(json.loads(msg))
+        if self.metrics is None and self.lag_monitor is None:
+            await self._handle_message(self._decode_message(msg))
+            return
+
+        started = time.perf_counter()
+        data = self._decode_message(msg)
+        decoded = time.perf_counter()
+        await self._handle_message(data)
+        finished = time.perf_counter()
+        if self.lag_monitor is not None:
+            self.lag_monitor.note(data, finished - started)
+        if self.metrics is not None:
+            self.metrics.observe_message(
+                data,
+                len(msg.encode("utf-8")) if isinstance(msg, str) else len(msg),
+                decoded - started,
+                finished - decoded,
+            )
 
     async def _ws_on_close(self):
         """Websocket on_close callback."""
@@ -257,6 +627,8 @@ class Homee:
         if self.connected:
             self.connected = False
             self._disconnected_event.set()
+            if self.metrics is not None:
+                self.metrics.connected_since = None
 
             await self.on_disconnected()
 
@@ -265,13 +637,35 @@ class Homee:
 
         await self.on_error(error)
 
-    async def send(self, msg: str):
-        """Send a raw string message to homee."""
+    async def send(
+        self,
+        msg: str,
+        key=None,
+        ttl: float | None = None,
+        priority: Priority = Priority.NORMAL,
+    ):
+        """Send a raw string message to homee.
+
+        Queued messages with a higher priority are sent first.
+
+        While disconnected, the message is discarded or, with an outbox, kept
+        for ttl seconds (default: outbox.ttl). A newer message with the same
+        key replaces it.
+        """
+
+        if self.should_close:
+            return
 
-        if not self.connected or self.should_close:
+        if not self.connected:
+            if self.outbox is not None:
+                self.outbox.add(msg, key, ttl, priority)
             return
 
-        await self._message_queue.put(msg)
+        if self.outbox is not None and key is not None:
+            # Don't overwrite this message with an older one after the resync.
+            self.outbox.discard(key)
+
+        await self._message_queue.put(msg, priority)
 
     async def reconnect(self):
         """Start a reconnection attempt."""
@@ -279,9 +673,68 @@ class Homee:
         await self.run()
 
     def disconnect(self):
-        """Disconnect from homee by closing the websocket connection."""
+        """Disconnect from homee by closing the websocket connection.
+
+        Queued messages are dropped, use close() to send them first and to
+        wait until the connection is closed.
+        """
 
         self.should_close = True
+        self._close_event.set()
+
+    async def close(
+        self, policy: ClosePolicy = ClosePolicy.FLUSH, timeout: float = 5.0
+    ):
+        """Close the connection and wait until run() has returned.
+
+        With ClosePolicy.FLUSH, queued messages and pending attribute batches
+        are sent and handled first, with ClosePolicy.DROP they are discarded.
+        If the connection is not closed within timeout seconds (including the
+        flush), it is aborted. The thread and process pools created by this
+        instance are shut down.
+        """
+        self._close_policy = policy
+        self._close_deadline = time.monotonic() + timeout
+        if policy == ClosePolicy.DROP:
+            if self.outbox is not None:
+                self.outbox.clear()
+            dropped = self._drop_message_queue()
+            if dropped:
+                _LOGGER.info(
+                    "Homee %s dropped %s queued messages", self.device, dropped
+                )
+        self.disconnect()
+
+        await self._stopped_event.wait()
+        self.commands.cancel()
+
+        if self._attribute_batcher is not None:
+            if policy == ClosePolicy.FLUSH:
+                await self._attribute_batcher.flush()
+            else:
+                self._attribute_batcher.cancel()
+
+        if self._owns_offloader:
+            self.offloader.shutdown()
+
+    async def __aenter__(self):
+        """Start run() and wait until the connection has been established."""
+        self._run_task = self.start()
+        # Fail early instead of waiting forever if run() gives up.
+        connected = asyncio.ensure_future(self.wait_until_connected())
+        await asyncio.wait(
+            [connected, self._run_task], return_when=asyncio.FIRST_COMPLETED
+        )
+        if not connected.done():
+            connected.cancel()
+            self._run_task.result()
+            raise HomeeException("Could not connect to homee")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        """Close the connection."""
+        await self.close()
+        await self._run_task
 
     async def _handle_message(self, msg: dict):
         """Handle incoming homee messages."""
@@ -297,7 +750,45 @@ class Homee:
 
         _LOGGER.debug(msg)
 
-        if msg_type == "all":
+        profiler = self.profiler
+        if profiler is not None:
+            nested = profiler.nested
+            started = time.perf_counter()
+
+        await self._dispatch_message(msg_type, msg)
+
+        if self._event_streams:
+            self._publish_event(msg_type, msg)
+
+        if profiler is not None:
+            # Time spent in listeners and callbacks is recorded separately.
+            elapsed = time.perf_counter() - started - (profiler.nested - nested)
+            profiler.record(STAGE_MODEL, msg_type, elapsed)
+
+        if (
+            self._attribute_batcher is not None
+            and len(self._attribute_batcher) >= self._attribute_batcher.max_size
+        ):
+            await self._attribute_batcher.flush()
+
+        if profiler is None:
+            await self.on_message(msg)
+        else:
+            started = time.perf_counter()
+            await self.on_message(msg)
+            profiler.record(
+                STAGE_ON_MESSAGE, self.on_message, time.perf_counter() - started
+            )
+
+    async def _dispatch_message(self, msg_type: str, msg: dict):
+        """Update the model with a message."""
+        if msg_type == "all" and isinstance(msg["all"], AllMessageParser):
+            parser = msg["all"]
+            await self._handle_all_streaming(parser)
+            # Everything after the model update sees the usual message.
+            msg["all"] = parser.data
+
+        elif msg_type == "all":
             self.settings = HomeeSettings(msg["all"]["settings"])
 
             # Create / Update nodes
@@ -320,7 +811,9 @@ class Homee:
             self._update_or_create_relationships(msg["all"]["relationships"])
 
             self._remap_relationships()
+            self.retries = 0
             self._connected_event.set()
+            await self._flush_outbox()
 
         elif msg_type == "attribute":
             await self._handle_attribute_change(msg["attribute"])
@@ -357,7 +850,52 @@ class Homee:
                 "Unknown/Unsupported message type: %s.\nMessage: %s", msg_type, msg
             )
 
-        await self.on_message(msg)
+    async def _handle_all_streaming(self, parser: AllMessageParser):
+        """Update the model with an 'all' message while it is being parsed."""
+        initial = len(self.nodes) <= 0
+        if initial:
+            self.nodes = []
+
+        for key, value in parser:
+            if key == "node":
+                if initial:
+                    self.nodes.append(HomeeNode(value))
+                else:
+                    self._update_or_create_node(value)
+            elif key == "settings":
+                self.settings = HomeeSettings(value)
+            elif key == "groups":
+                for group_data in value:
+                    self._update_or_create_group(group_data)
+            elif key == "users":
+                for user_data in value:
+                    self._update_or_create_user(user_data)
+            elif key == "relationships":
+                self._update_or_create_relationships(value)
+
+        self._remap_relationships()
+        # Only a connection that delivered the model resets the backoff, peers
+        # that accept the handshake and then stop answering are backed off.
+        self.retries = 0
+        self._connected_event.set()
+        await self._flush_outbox()
+
+    async def _flush_outbox(self):
+        """Send the messages that were sent while disconnected, now that the model is up to date."""
+        if self.outbox is None or len(self.outbox) == 0:
+            return
+        messages = self.outbox.drain()
+        _LOGGER.info(
+            "Homee %s sending %s messages from the outbox", self.device, len(messages)
+        )
+        for msg, priority in messages:
+            await self.send(msg, priority=priority)
+
+    def _publish_event(self, msg_type: str, msg: dict):
+        """Push a message to all open event streams."""
+        event = HomeeEvent.from_message(msg_type, msg)
+        for stream in list(self._event_streams):
+            stream.push(event)
 
     async def _handle_attribute_change(self, attribute_data: dict):
         """Handle an attribute changed message."""
@@ -367,14 +905,102 @@ class Homee:
         attr_node_id = attribute_data["node_id"]
         node = self.get_node_by_id(attr_node_id)
         if node is not None:
-            node.update_attribute(attribute_data)
-            await self.on_attribute_updated(attribute_data, node)
+            if len(self.commands):
+                node.update_attribute(
+                    self._reconcile_command(attribute_data), self._listener_observer
+                )
+            else:
+                node.update_attribute(attribute_data, self._listener_observer)
+            if self.profiler is None:
+                await self.on_attribute_updated(attribute_data, node)
+            else:
+                started = time.perf_counter()
+                await self.on_attribute_updated(attribute_data, node)
+                self.profiler.record(
+                    STAGE_ON_ATTRIBUTE_UPDATED,
+                    self.on_attribute_updated,
+                    time.perf_counter() - started,
+                    node,
+                )
+            if self._attribute_batcher is not None:
+                self._attribute_batcher.add(attribute_data, node)
+
+    async def _on_lag_spike(self, lag: float, msg_type: str | None, duration: float):
+        """Log a lag spike and pass it to on_loop_lag()."""
+        log_lag_spike(lag, msg_type, duration)
+        await self.on_loop_lag(lag, msg_type)
+
+    def _reconcile_command(self, attribute_data: dict) -> dict:
+        """Confirm a pending command with an attribute update and return the data to apply.
+
+        While an optimistic command is not confirmed, its target stays the
+        current value and the reported data is kept for a rollback.
+        """
+        if self.commands.confirm(attribute_data) is not None:
+            return attribute_data
+        command = self.commands.get(attribute_data["node_id"], attribute_data["id"])
+        if command is None or command.previous is None:
+            return attribute_data
+        command.previous = attribute_data
+        return {**attribute_data, "current_value": command.target}
+
+    def _on_command_confirmed(self, command: PendingCommand, duration: float):
+        if command.previous is not None:
+            attribute = self._get_attribute(command.node_id, command.attribute_id)
+            if attribute is not None:
+                attribute.pending = False
+        if self.metrics is not None:
+            self.metrics.command_seconds.observe(
+                duration, protocol_name(command.protocol)
+            )
+
+    def _on_command_timeout(self, command: PendingCommand):
+        if self.metrics is not None:
+            self.metrics.command_timeouts.inc(protocol_name(command.protocol))
+        if command.previous is None:
+            return
+
+        node = self.get_node_by_id(command.node_id)
+        attribute = node.get_attribute_by_id(command.attribute_id) if node else None
+        if attribute is None:
+            return
+        _LOGGER.info(
+            "Rolling back attribute %s of node %s to %s",
+            command.attribute_id,
+            command.node_id,
+            command.previous.get("current_value"),
+        )
+        attribute.pending = False
+        node.update_attribute(command.previous, self._listener_observer)
+        if self._event_streams:
+            self._publish_event("rollback", {"rollback": command.previous})
+        task = asyncio.create_task(self.on_command_rollback(command.previous, node))
+        self._hook_tasks.add(task)
+        task.add_done_callback(self._hook_tasks.discard)
+
+    def _get_attribute(self, node_id: int, attribute_id: int):
+        node = self.get_node_by_id(node_id)
+        return node.get_attribute_by_id(attribute_id) if node is not None else None
+
+    def _observe_listener(self, node: HomeeNode, listener: Callable, duration: float):
+        """Record the time a node listener took."""
+        if self.metrics is not None:
+            self.metrics.observe_listener(node, listener, duration)
+        if self.profiler is not None:
+            self.profiler.record(STAGE_LISTENER, listener, duration, node)
 
     def _update_or_create_node(self, node_data: dict):
         existing_node = self.get_node_by_id(node_data["id"])
         if existing_node is not None:
             existing_node.set_data(node_data)
-            existing_node.update_attributes(node_data["attributes"])
+            attributes = node_data["attributes"]
+            if len(self.commands):
+                # Before the update, so listeners see the new pending state.
+                attributes = [self._reconcile_command(a) for a in attributes]
+            existing_node.update_attributes(attributes, self._listener_observer)
+            if self._attribute_batcher is not None:
+                for attribute_data in node_data["attributes"]:
+                    self._attribute_batcher.add(attribute_data, existing_node)
         else:
             self.nodes.append(HomeeNode(node_data))
             self._remap_relationships()
@@ -404,8 +1030,17 @@ class Homee:
                 HomeeRelationship(relationship_data) for relationship_data in data
             ]
         else:
+            # Remapping after every relationship is quadratic, the callers
+            # remap once afterwards.
+            existing = {r.id: r for r in self.relationships}
             for relationship_data in data:
-                self._update_or_create_relationship(relationship_data)
+                relationship = existing.get(relationship_data["id"])
+                if relationship is not None:
+                    relationship.set_data(relationship_data)
+                else:
+                    relationship = HomeeRelationship(relationship_data)
+                    self.relationships.append(relationship)
+                    existing[relationship.id] = relationship
 
     def _remap_relationships(self):
         """Remap the relationships between nodes and groups defined by the relationships list."""
@@ -458,6 +1093,10 @@ class Homee:
         index = self.get_node_index(node_id)
         return self.nodes[index] if index != -1 else None
 
+    def listener_counts(self) -> dict[int, int]:
+        """Return the number of on_changed listeners per node id."""
+        return {node.id: node.listener_count for node in self.nodes}
+
     def get_group_index(self, group_id: int) -> int:
         """Return the index of the group with the given id or -1 if none exists."""
         return next(
@@ -481,44 +1120,254 @@ class Homee:
         )
         return self.devices[index] if index != -1 else None
 
-    async def set_value(self, device_id: int, attribute_id: int, value: float):
-        """Set the target value of an attribute of a device."""
+    async def set_value(
+        self,
+        device_id: int,
+        attribute_id: int,
+        value: float,
+        ttl: float | None = None,
+        confirm: bool = False,
+        confirm_timeout: float = 30.0,
+        optimistic: bool = False,
+    ) -> asyncio.Future | None:
+        """Set the target value of an attribute of a device.
+
+        While disconnected, the command is kept in the outbox (if any) for ttl
+        seconds. Only the latest command for an attribute is kept.
+
+        With confirm=True, a future is returned. It resolves to the seconds it
+        took until homee reported value as the current value of the attribute,
+        or fails with a CommandTimeoutError after confirm_timeout seconds (or a
+        CommandSupersededError if the attribute was set again before).
+
+        With optimistic=True, value becomes the current value of the local
+        attribute right away and the attribute is flagged as pending. If homee
+        does not confirm it within confirm_timeout seconds, the attribute is
+        rolled back to the value reported by homee and on_command_rollback()
+        is called. Listeners are notified about both changes.
+        """
 
         _LOGGER.info(
             "Set value: Device: %s Attribute: %s To: %s", device_id, attribute_id, value
         )
+        future = self._track_command(
+            device_id, attribute_id, value, confirm, confirm_timeout, optimistic
+        )
         await self.send(
-            f"PUT:/nodes/{device_id}/attributes/{attribute_id}?target_value={value}"
+            f"PUT:/nodes/{device_id}/attributes/{attribute_id}?target_value={value}",
+            key=(device_id, attribute_id),
+            ttl=ttl,
+            priority=Priority.INTERACTIVE,
         )
+        return future
+
+    async def set_values(
+        self,
+        values: Iterable[tuple[int, int, float]],
+        ttl: float | None = None,
+        confirm: bool = False,
+        confirm_timeout: float = 30.0,
+        optimistic: bool = False,
+    ) -> asyncio.Future | None:
+        """Set the target values of many attributes at once.
+
+        values contains (node id, attribute id, value) tuples. All commands
+        are queued together and work like set_value(). With confirm=True, a
+        future is returned that resolves once every command was confirmed or
+        failed, to a list with the result (seconds or exception) of each.
+        """
+        values = list(values)
+        _LOGGER.info("Set %s values", len(values))
+        futures = [
+            self._track_command(
+                device_id, attribute_id, value, confirm, confirm_timeout, optimistic
+            )
+            for device_id, attribute_id, value in values
+        ]
+        for device_id, attribute_id, value in values:
+            await self.send(
+                f"PUT:/nodes/{device_id}/attributes/{attribute_id}?target_value={value}",
+                key=(device_id, attribute_id),
+                ttl=ttl,
+                priority=Priority.INTERACTIVE,
+            )
+        if not confirm:
+            return None
+        return asyncio.gather(*futures, return_exceptions=True)
+
+    async def set_group_value(
+        self,
+        group_id: int,
+        attribute_type: int,
+        value: float,
+        ttl: float | None = None,
+        confirm: bool = False,
+        confirm_timeout: float = 30.0,
+        optimistic: bool = False,
+    ) -> asyncio.Future | None:
+        """Set the editable attributes of attribute_type of all nodes in a group, see set_values()."""
+        group = self.get_group_by_id(group_id)
+        if group is None:
+            _LOGGER.warning("Group %s does not exist", group_id)
+            return None
+        return await self.set_values(
+            (
+                (node.id, attribute.id, value)
+                for node in group.nodes
+                for attribute in node.attributes
+                if attribute.type == attribute_type and attribute.editable
+            ),
+            ttl,
+            confirm,
+            confirm_timeout,
+            optimistic,
+        )
+
+    def _track_command(
+        self,
+        device_id: int,
+        attribute_id: int,
+        value: float,
+        confirm: bool,
+        confirm_timeout: float,
+        optimistic: bool,
+    ) -> asyncio.Future | None:
+        """Track a set_value() command if needed and apply it optimistically."""
+        if not (confirm or optimistic or self.metrics is not None):
+            return None
+
+        future = asyncio.get_running_loop().create_future() if confirm else None
+        node = self.get_node_by_id(device_id)
+        previous = self.commands.get(device_id, attribute_id)
+        command = self.commands.track(
+            device_id,
+            attribute_id,
+            value,
+            node.protocol if node is not None else None,
+            confirm_timeout,
+            future,
+        )
+
+        attribute = node.get_attribute_by_id(attribute_id) if node else None
+        if previous is not None and previous.previous is not None:
+            # Roll back to what homee reported, not to an optimistic value.
+            command.previous = previous.previous
+        elif optimistic and attribute is not None:
+            command.previous = attribute.raw_data
+        if command.previous is not None and attribute is not None:
+            attribute.pending = True
+            node.update_attribute(
+                {**attribute.raw_data, "current_value": value},
+                self._listener_observer,
+            )
+        return future
+
+    def subscribe(
+        self,
+        node_id: int,
+        listener: Callable,
+        mode: SubscriptionMode = SubscriptionMode.IMMEDIATE,
+        interval: float = 0,
+        attribute_id: int | None = None,
+        attribute_type: int | None = None,
+        executor: ExecutorMode | None = None,
+    ) -> AttributeSubscription:
+        """Subscribe to attribute updates of a node at a controlled rate.
+
+        The listener is called with (node, attribute) like a node listener.
+        If executor is set, the listener runs in a thread or process pool and
+        receives snapshots instead, see offload_listener().
+        Call cancel() on the returned subscription to stop receiving updates.
+        """
+        node = self.get_node_by_id(node_id)
+        if node is None:
+            raise ValueError(f"Node {node_id} does not exist")
+
+        if executor is not None:
+            listener = self.offload_listener(listener, executor)
+
+        return AttributeSubscription(
+            node,
+            listener,
+            self.timer_wheel,
+            mode,
+            interval,
+            attribute_id,
+            attribute_type,
+        )
+
+    def offload_listener(
+        self,
+        listener: Callable,
+        mode: ExecutorMode = ExecutorMode.THREAD,
+        on_result: Callable | None = None,
+    ) -> OffloadedListener:
+        """Wrap a listener so it runs in a thread or process pool.
+
+        The returned listener can be passed to HomeeNode.add_on_changed_listener()
+        or subscribe(). The wrapped listener is called with a NodeSnapshot and an
+        AttributeSnapshot and must be picklable when running in a process pool.
+        """
+        return OffloadedListener(self.offloader, listener, mode, on_result)
+
+    def run_in_executor(
+        self, func: Callable, *args, mode: ExecutorMode = ExecutorMode.THREAD
+    ) -> asyncio.Future:
+        """Run func(*args) in a thread or process pool and return an awaitable future.
+
+        Use this for heavy work in on_attribute_updated() without blocking the loop.
+        """
+        return self.offloader.submit(mode, func, *args)
+
+    def events(
+        self,
+        filter: EventFilter | None = None,
+        maxsize: int = 256,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+    ) -> EventStream:
+        """Return a new stream of incoming messages to be consumed with `async for`.
+
+        Each stream has its own bounded buffer, so consumers don't block each other
+        or the receive loop. Close the stream (or use it with `async with`)
+        once it is no longer needed.
+        """
+        stream = EventStream(filter, maxsize, overflow, self._event_streams.pop)
+        self._event_streams[stream] = None
+        return stream
 
     async def update_node(self, node_id: int):
         """Request current data for a node."""
         _LOGGER.info("Request current data for node %s", node_id)
-        await self.send(f"GET:/nodes/{node_id}/")
+        await self.send(f"GET:/nodes/{node_id}/", priority=Priority.BACKGROUND)
 
     async def update_attribute(self, node_id: int, attribute_id: int):
         """Request current data for an attribute."""
         _LOGGER.info(
             "Request current data for attribute %s of device %s", attribute_id, node_id
         )
-        await self.send(f"GET:/nodes/{node_id}/attributes/{attribute_id}")
+        await self.send(
+            f"GET:/nodes/{node_id}/attributes/{attribute_id}",
+            priority=Priority.BACKGROUND,
+        )
 
     async def play_homeegram(self, homeegram_id: int):
         """Invoke a homeegram."""
 
-        await self.send(f"PUT:homeegrams/{homeegram_id}?play=1")
+        await self.send(
+            f"PUT:homeegrams/{homeegram_id}?play=1", priority=Priority.INTERACTIVE
+        )
 
     @property
     def url(self):
         """Local homee url."""
 
-        return f"http://{self.host}:7681"
+        return f"http://{self.host}:{self.port}"
 
     @property
     def ws_url(self):
         """Local homee websocket url."""
 
-        return f"ws://{self.host}:7681"
+        return f"ws://{self.host}:{self.port}"
 
     def wait_until_connected(self):
         """Return a coroutine that runs until a connection has been established."""
@@ -537,7 +1386,7 @@ class Homee:
         _LOGGER.warning(
             "Could not reconnect Homee %s after %s retries",
             self.device,
-            self.max_retries,
+            self.retries,
         )
 
     async def on_connected(self):
@@ -571,6 +1420,27 @@ class Homee:
         Contains the parsed json attribute data and the corresponding node instance.
         """
 
+    async def on_command_rollback(self, attribute_data: dict, node: HomeeNode):
+        """Execute when an optimistic set_value() was not confirmed and rolled back.
+
+        Contains the attribute data reported by homee that was restored.
+        """
+
+    async def on_loop_lag(self, lag: float, msg_type: str | None):
+        """Execute when the event loop lagged more than lag_threshold seconds.
+
+        msg_type is the type of the message whose handling caused the lag, or
+        None if the process was blocked by something else.
+        """
+
+    async def on_attributes_updated(self, batch: list[tuple[dict, HomeeNode]]):
+        """Execute with a batch of attribute updates. Requires batch_window to be set.
+
+        Contains (attribute_data, node) tuples for every attribute that was updated
+        by 'attribute', 'node' or 'nodes' messages within the batch window.
+        Only the latest update of each attribute is included.
+        """
+
 
 class HomeeException(Exception):
     """Base class for all errors thrown by this library."""
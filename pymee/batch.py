@@ -0,0 +1,82 @@
+"""Micro-batching of attribute updates."""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+import logging
+
+from .model import HomeeNode
+from .timer import TimerWheel, WheelTimer
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AttributeUpdateBatcher:
+    """Collect attribute updates and flush them as one list.
+
+    A batch is flushed once `window` seconds passed since its first update or
+    once it holds `max_size` distinct attributes, whichever happens first.
+    Several updates of the same attribute within a batch are merged, only the
+    latest one is kept.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[list[tuple[dict, HomeeNode]]], Awaitable],
+        wheel: TimerWheel,
+        window: float,
+        max_size: int = 500,
+    ) -> None:
+        """Initialize the batcher."""
+        if window <= 0 or max_size <= 0:
+            raise ValueError("window and max_size must be positive")
+
+        self.window = window
+        self.max_size = max_size
+
+        self._flush = flush
+        self._wheel = wheel
+        self._timer: WheelTimer = None
+        self._batch: dict[tuple[int, int], tuple[dict, HomeeNode]] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        """Return the number of attributes in the current batch."""
+        return len(self._batch)
+
+    def add(self, attribute_data: dict, node: HomeeNode) -> bool:
+        """Add an update to the batch. Return True if the batch is full."""
+        self._batch[(node.id, attribute_data["id"])] = (attribute_data, node)
+        if self._timer is None:
+            self._timer = self._wheel.schedule(self.window, self._on_window)
+
+        return len(self._batch) >= self.max_size
+
+    async def flush(self):
+        """Flush the current batch right away."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._batch:
+            return
+
+        batch = list(self._batch.values())
+        self._batch = {}
+        await self._flush(batch)
+
+    def cancel(self) -> None:
+        """Drop the current batch and stop pending flushes."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._batch.clear()
+
+    def _on_window(self) -> None:
+        self._timer = None
+        task = asyncio.create_task(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._on_flushed)
+
+    def _on_flushed(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            _LOGGER.error("Error while flushing attribute batch: %s", task.exception())
@@ -0,0 +1,168 @@
+"""Confirmation of commands by the attribute updates they cause."""
+
+import asyncio
+from collections.abc import Callable
+import logging
+import math
+import time
+
+from .const import NodeProtocol
+from .timer import TimerWheel, WheelTimer
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CommandTimeoutError(TimeoutError):
+    """Raised when homee did not report the target value of a command in time."""
+
+
+class CommandSupersededError(Exception):
+    """Raised when a newer command for the same attribute was sent."""
+
+
+def protocol_name(protocol: int | None) -> str:
+    """Return a readable name of a node protocol, i.e. for metric labels."""
+    try:
+        return NodeProtocol(protocol).name.lower()
+    except ValueError:
+        return "unknown"
+
+
+class PendingCommand:
+    """A set_value() command that waits for homee to report its target value."""
+
+    __slots__ = (
+        "node_id",
+        "attribute_id",
+        "target",
+        "protocol",
+        "started",
+        "future",
+        "timer",
+        "previous",
+    )
+
+    def __init__(
+        self,
+        node_id: int,
+        attribute_id: int,
+        target: float,
+        protocol: int | None,
+        future: asyncio.Future | None,
+    ) -> None:
+        """Initialize the command, started now."""
+        self.node_id = node_id
+        self.attribute_id = attribute_id
+        self.target = target
+        self.protocol = protocol
+        self.started = time.monotonic()
+        self.future = future
+        self.timer: WheelTimer = None
+        # For optimistic commands, the latest attribute data reported by homee.
+        self.previous: dict = None
+
+    def matches(self, value) -> bool:
+        """Return whether value is the target value."""
+        if value is None:
+            return False
+        return math.isclose(value, self.target, rel_tol=1e-9, abs_tol=1e-9)
+
+
+class CommandTracker:
+    """Match sent commands with the attribute updates that confirm them.
+
+    on_confirmed(command, seconds) is called when an update reports the target
+    value of a command, on_timeout(command) when none did within the timeout
+    of the command. Only the latest command per attribute is tracked.
+    """
+
+    def __init__(
+        self,
+        timer_wheel: TimerWheel,
+        on_confirmed: Callable[[PendingCommand, float], None] | None = None,
+        on_timeout: Callable[[PendingCommand], None] | None = None,
+    ) -> None:
+        """Initialize the tracker with the timer wheel used for timeouts."""
+        self.timer_wheel = timer_wheel
+        self.on_confirmed = on_confirmed
+        self.on_timeout = on_timeout
+        self._pending: dict[tuple[int, int], PendingCommand] = {}
+
+    def __len__(self) -> int:
+        """Return the number of pending commands."""
+        return len(self._pending)
+
+    def get(self, node_id: int, attribute_id: int) -> PendingCommand | None:
+        """Return the pending command for an attribute, if any."""
+        return self._pending.get((node_id, attribute_id))
+
+    def track(
+        self,
+        node_id: int,
+        attribute_id: int,
+        target: float,
+        protocol: int | None,
+        timeout: float,
+        future: asyncio.Future | None = None,
+    ) -> PendingCommand:
+        """Start waiting for attribute_id of node_id to reach target."""
+        key = (node_id, attribute_id)
+        previous = self._pending.pop(key, None)
+        if previous is not None:
+            previous.timer.cancel()
+            if previous.future is not None and not previous.future.done():
+                previous.future.set_exception(
+                    CommandSupersededError(
+                        f"Attribute {attribute_id} of node {node_id} "
+                        f"was set to {target} before reaching {previous.target}"
+                    )
+                )
+
+        command = PendingCommand(node_id, attribute_id, target, protocol, future)
+        command.timer = self.timer_wheel.schedule(timeout, self._expire, key, command)
+        self._pending[key] = command
+        return command
+
+    def confirm(self, attribute_data: dict) -> PendingCommand | None:
+        """Complete the command confirmed by an attribute update, if any."""
+        key = (attribute_data["node_id"], attribute_data["id"])
+        command = self._pending.get(key)
+        if command is None or not command.matches(attribute_data.get("current_value")):
+            return None
+
+        del self._pending[key]
+        command.timer.cancel()
+        duration = time.monotonic() - command.started
+        if command.future is not None and not command.future.done():
+            command.future.set_result(duration)
+        if self.on_confirmed is not None:
+            self.on_confirmed(command, duration)
+        return command
+
+    def cancel(self) -> None:
+        """Stop waiting for all pending commands."""
+        for command in self._pending.values():
+            command.timer.cancel()
+            if command.future is not None:
+                command.future.cancel()
+        self._pending.clear()
+
+    def _expire(self, key: tuple[int, int], command: PendingCommand) -> None:
+        if self._pending.get(key) is not command:
+            return
+        del self._pending[key]
+        _LOGGER.info(
+            "Attribute %s of node %s did not reach %s in time",
+            command.attribute_id,
+            command.node_id,
+            command.target,
+        )
+        if command.future is not None and not command.future.done():
+            command.future.set_exception(
+                CommandTimeoutError(
+                    f"Attribute {command.attribute_id} of node {command.node_id} "
+                    f"did not reach {command.target}"
+                )
+            )
+        if self.on_timeout is not None:
+            self.on_timeout(command)
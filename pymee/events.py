@@ -0,0 +1,213 @@
+"""Async iterator based event streams for consuming homee messages."""
+
+import asyncio
+from collections import deque
+from collections.abc import Callable, Iterable
+from enum import IntEnum, unique
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@unique
+class OverflowPolicy(IntEnum):
+    """What an event stream does when its buffer is full."""
+
+    # Discard the oldest buffered event to make room for the new one.
+    DROP_OLDEST = 0
+    # Discard the new event and keep the buffered ones.
+    DROP_NEWEST = 1
+    # Close the stream. The consumer receives a StreamOverflowError.
+    CLOSE = 2
+
+
+class StreamOverflowError(Exception):
+    """Raised by an event stream that was closed because its buffer overflowed."""
+
+
+class HomeeEvent:
+    """A single message received from homee."""
+
+    __slots__ = ("type", "data", "node_id", "attribute_type", "node_ids")
+
+    def __init__(
+        self,
+        msg_type: str,
+        data,
+        node_id: int | None = None,
+        attribute_type: int | None = None,
+        node_ids: frozenset[int] | None = None,
+    ) -> None:
+        """Initialize the event. node_ids are the ids of the nodes in a bulk message."""
+        self.type = msg_type
+        self.data = data
+        self.node_id = node_id
+        self.attribute_type = attribute_type
+        self.node_ids = node_ids
+
+    @classmethod
+    def from_message(cls, msg_type: str, msg: dict):
+        """Create an event from a parsed homee message."""
+        data = msg[msg_type]
+        if msg_type in ("attribute", "rollback"):
+            return cls(msg_type, data, data.get("node_id"), data.get("type"))
+        if msg_type == "node":
+            return cls(msg_type, data, data.get("id"))
+        if msg_type == "nodes":
+            return cls(msg_type, data, node_ids=_node_ids(data))
+        if msg_type == "all":
+            return cls(msg_type, data, node_ids=_node_ids(data.get("nodes", ())))
+        return cls(msg_type, data)
+
+    def __repr__(self) -> str:
+        """Return a short representation of the event."""
+        return (
+            f"HomeeEvent(type={self.type!r}, node_id={self.node_id}, "
+            f"attribute_type={self.attribute_type})"
+        )
+
+
+def _node_ids(nodes: Iterable[dict]) -> frozenset[int]:
+    return frozenset(node.get("id") for node in nodes)
+
+
+class EventFilter:
+    """Select events by message type, node id and attribute type.
+
+    Every criterion that is set must match. Bulk messages ("nodes", "all")
+    match node ids if any of their nodes does, and are passed on as a whole.
+    Events that don't carry a node id or attribute type never match a filter
+    on those.
+    """
+
+    def __init__(
+        self,
+        message_types: Iterable[str] | None = None,
+        node_ids: Iterable[int] | None = None,
+        attribute_types: Iterable[int] | None = None,
+    ) -> None:
+        """Initialize the filter."""
+        self.message_types = frozenset(message_types) if message_types else None
+        self.node_ids = frozenset(node_ids) if node_ids else None
+        self.attribute_types = frozenset(attribute_types) if attribute_types else None
+
+    def matches(self, event: HomeeEvent) -> bool:
+        """Return whether the event passes the filter."""
+        if self.message_types is not None and event.type not in self.message_types:
+            return False
+        if self.node_ids is not None:
+            if event.node_ids is not None:
+                if self.node_ids.isdisjoint(event.node_ids):
+                    return False
+            elif event.node_id not in self.node_ids:
+                return False
+        if (
+            self.attribute_types is not None
+            and event.attribute_type not in self.attribute_types
+        ):
+            return False
+        return True
+
+
+class EventStream:
+    """Bounded buffer of events that can be consumed with `async for`.
+
+    Events are pushed without blocking, so a slow consumer never holds up the
+    receive loop or other consumers. Once the buffer is full, the overflow
+    policy decides which events are lost.
+    """
+
+    def __init__(
+        self,
+        event_filter: EventFilter | None = None,
+        maxsize: int = 256,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        on_close: Callable | None = None,
+    ) -> None:
+        """Initialize the stream."""
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+
+        self.filter = event_filter
+        self.maxsize = maxsize
+        self.overflow = OverflowPolicy(overflow)
+        self.dropped = 0
+
+        self._buffer: deque[HomeeEvent] = deque(
+            maxlen=maxsize if self.overflow == OverflowPolicy.DROP_OLDEST else None
+        )
+        self._waiter: asyncio.Future = None
+        self._closed = False
+        self._error: Exception = None
+        self._on_close = on_close
+
+    def __len__(self) -> int:
+        """Return the number of buffered events."""
+        return len(self._buffer)
+
+    @property
+    def closed(self) -> bool:
+        """Whether the stream was closed."""
+        return self._closed
+
+    def push(self, event: HomeeEvent) -> bool:
+        """Buffer an event if it passes the filter. Return whether it was buffered."""
+        if self._closed:
+            return False
+        if self.filter is not None and not self.filter.matches(event):
+            return False
+
+        if len(self._buffer) >= self.maxsize:
+            self.dropped += 1
+            if self.overflow == OverflowPolicy.DROP_NEWEST:
+                return False
+            if self.overflow == OverflowPolicy.CLOSE:
+                self._error = StreamOverflowError(
+                    f"Event stream overflowed after {self.maxsize} events"
+                )
+                self.close()
+                return False
+
+        self._buffer.append(event)
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+        return True
+
+    def close(self) -> None:
+        """Close the stream. Buffered events can still be consumed."""
+        if self._closed:
+            return
+
+        self._closed = True
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+        if self._on_close is not None:
+            self._on_close(self)
+
+    def __aiter__(self):
+        """Return the stream itself as iterator."""
+        return self
+
+    async def __anext__(self) -> HomeeEvent:
+        """Wait for and return the next event."""
+        while not self._buffer:
+            if self._closed:
+                if self._error is not None:
+                    raise self._error
+                raise StopAsyncIteration
+
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+        return self._buffer.popleft()
+
+    async def __aenter__(self):
+        """Enter the stream context."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Close the stream when leaving the context."""
+        self.close()
@@ -0,0 +1,424 @@
+"""Local stand-in for a homee cube, for integration and load tests.
+
+Serves /access_token over HTTP and the /connection websocket (subprotocol v2)
+and answers GET:all, GET:/nodes/... and PUT:/nodes/... requests. Latency,
+spontaneous attribute updates and disconnects can be scripted.
+
+Run `python -m pymee.fake_server` to start a server from the command line.
+"""
+
+import argparse
+import asyncio
+from collections.abc import Iterator
+import hashlib
+import json
+import logging
+import random
+import re
+import secrets
+import time
+from urllib.parse import parse_qs
+
+from aiohttp import BasicAuth, WSMsgType, web
+
+from . import generator
+from .const import AttributeType, NodeProfile
+
+_LOGGER = logging.getLogger(__name__)
+
+_NODE_PATH = re.compile(r"^/?nodes/(\d+)/?(?:attributes/?(\d+)?)?/?(?:\?(.*))?$")
+
+
+def demo_home() -> dict:
+    """Return the data of a small home with a plug, a thermostat and a shutter."""
+    now = int(time.time())
+    return {
+        "settings": generator.settings("Fake homee", timestamp=now),
+        "nodes": [
+            generator.node(
+                1,
+                "Plug",
+                NodeProfile.METERING_PLUG,
+                [
+                    generator.attribute(1, 1, AttributeType.ON_OFF, timestamp=now),
+                    generator.attribute(
+                        2, 1, AttributeType.CURRENT_ENERGY_USE, timestamp=now
+                    ),
+                ],
+                timestamp=now,
+            ),
+            generator.node(
+                2,
+                "Thermostat",
+                NodeProfile.RADIATOR_THERMOSTAT,
+                [
+                    generator.attribute(
+                        3, 2, AttributeType.TEMPERATURE, 20, timestamp=now
+                    ),
+                    generator.attribute(
+                        4, 2, AttributeType.TARGET_TEMPERATURE, timestamp=now
+                    ),
+                ],
+                timestamp=now,
+            ),
+            generator.node(
+                3,
+                "Shutter",
+                NodeProfile.ELECTRIC_MOTOR_METERING_SWITCH,
+                [
+                    generator.attribute(5, 3, AttributeType.UP_DOWN, timestamp=now),
+                    generator.attribute(6, 3, AttributeType.POSITION, timestamp=now),
+                ],
+                timestamp=now,
+            ),
+        ],
+        "groups": [],
+        "relationships": [],
+        "users": [],
+        "homeegrams": [],
+        "plans": [],
+    }
+
+
+class FakeHomeeServer:
+    """A scriptable fake homee cube.
+
+    latency delays every response (and the confirmation of a PUT). With
+    update_rate > 0, random attribute updates are pushed to all clients at
+    that rate (updates per second). Alternatively, updates can be replayed from
+    a stream of (seconds since start, message) tuples, e.g.
+    HomeGenerator.update_stream(). Faults can be triggered with
+    disconnect_all(), freeze() and fail_auth.
+    """
+
+    def __init__(
+        self,
+        data: dict | None = None,
+        user: str = "homee",
+        password: str = "homee",
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        update_rate: float = 0.0,
+        token_lifetime: int = 3600,
+        seed: int | None = None,
+        updates: Iterator[tuple[float, dict]] | None = None,
+    ) -> None:
+        """Initialize the server. Use port=0 to pick a free port on start()."""
+        self.data = data if data is not None else demo_home()
+        self.user = user
+        self.password = password
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.update_rate = update_rate
+        self.updates = updates
+        self.token_lifetime = token_lifetime
+        self.fail_auth = False
+
+        self.messages_received = 0
+        self.messages_sent = 0
+        self.connections = 0
+
+        self._random = random.Random(seed)
+        self._tokens: set[str] = set()
+        self._clients: set[web.WebSocketResponse] = set()
+        self._frozen = asyncio.Event()
+        self._frozen.set()
+        self._runner: web.AppRunner = None
+        self._updater: asyncio.Task = None
+        self._answers: set[asyncio.Task] = set()
+        self._attributes: dict[int, dict] = {}
+        self._index()
+
+    def _index(self) -> None:
+        self._nodes = {node["id"]: node for node in self.data["nodes"]}
+        self._attributes = {
+            attribute["id"]: attribute
+            for node in self.data["nodes"]
+            for attribute in node["attributes"]
+        }
+        # Attributes that change on their own, i.e. measurements.
+        self._sensors = [
+            attribute
+            for attribute in self._attributes.values()
+            if not attribute["editable"] and attribute["maximum"] > attribute["minimum"]
+        ]
+
+    @property
+    def client_count(self) -> int:
+        """Number of connected websocket clients."""
+        return len(self._clients)
+
+    async def start(self) -> None:
+        """Start serving."""
+        app = web.Application()
+        app.router.add_post("/access_token", self._handle_access_token)
+        app.router.add_get("/connection", self._handle_connection)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        self._updater = asyncio.create_task(self._push_updates())
+        _LOGGER.info("Fake homee listening on %s:%s", self.host, self.port)
+
+    async def stop(self) -> None:
+        """Disconnect all clients and stop serving."""
+        if self._updater is not None:
+            self._updater.cancel()
+            self._updater = None
+        self._frozen.set()
+        await self.disconnect_all(1001)
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def disconnect_all(self, code: int = 1011) -> None:
+        """Close all websocket connections with the given close code."""
+        for ws in list(self._clients):
+            await ws.close(code=code)
+
+    def freeze(self) -> None:
+        """Stop reading, answering and sending, like a cube that lost power."""
+        self._frozen.clear()
+
+    def thaw(self) -> None:
+        """Resume after freeze()."""
+        self._frozen.set()
+
+    def schedule_disconnect(self, delay: float, code: int = 1011) -> asyncio.Task:
+        """Disconnect all clients after delay seconds."""
+
+        async def _disconnect():
+            await asyncio.sleep(delay)
+            await self.disconnect_all(code)
+
+        return asyncio.create_task(_disconnect())
+
+    async def set_attribute(
+        self, attribute_id: int, value: float, last_value: float | None = None
+    ) -> None:
+        """Change the current value of an attribute and notify all clients.
+
+        last_value defaults to the current value before the change.
+        """
+        attribute = self._attributes[attribute_id]
+        attribute["last_value"] = (
+            last_value if last_value is not None else attribute["current_value"]
+        )
+        attribute["current_value"] = value
+        attribute["target_value"] = value
+        attribute["last_changed"] = int(time.time())
+        await self.broadcast({"attribute": attribute})
+
+    async def broadcast(self, msg: dict) -> None:
+        """Send a message to all clients."""
+        frame = json.dumps(msg)
+        for ws in list(self._clients):
+            await self._send(ws, frame)
+
+    async def _send(self, ws: web.WebSocketResponse, frame: str) -> None:
+        await self._frozen.wait()
+        if ws.closed:
+            return
+        try:
+            await ws.send_str(frame)
+        except ConnectionError:
+            return
+        self.messages_sent += 1
+
+    async def _handle_access_token(self, request: web.Request) -> web.Response:
+        expected = BasicAuth(
+            self.user, hashlib.sha512(self.password.encode("utf-8")).hexdigest()
+        )
+        try:
+            auth = BasicAuth.decode(request.headers.get("Authorization", ""))
+        except ValueError:
+            auth = None
+        if self.fail_auth or auth != expected:
+            return web.Response(status=401, text="")
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        token = secrets.token_hex(32)
+        self._tokens.add(token)
+        return web.Response(
+            text=(
+                f"access_token={token}&user_id=1&device_id=1"
+                f"&expires={self.token_lifetime}"
+            ),
+            content_type="application/x-www-form-urlencoded",
+        )
+
+    async def _handle_connection(self, request: web.Request):
+        if request.query.get("access_token") not in self._tokens:
+            return web.Response(status=401)
+
+        # Pings are answered by hand, so a frozen server stops answering them.
+        ws = web.WebSocketResponse(protocols=("v2",), max_msg_size=0, autoping=False)
+        await ws.prepare(request)
+        self._clients.add(ws)
+        self.connections += 1
+
+        try:
+            while True:
+                await self._frozen.wait()
+                msg = await ws.receive()
+                if msg.type == WSMsgType.PING:
+                    await self._frozen.wait()
+                    try:
+                        await ws.pong(msg.data)
+                    except ConnectionError:
+                        break
+                    continue
+                if msg.type == WSMsgType.PONG:
+                    continue
+                if msg.type != WSMsgType.TEXT:
+                    break
+
+                self.messages_received += 1
+                await self._frozen.wait()
+                task = asyncio.create_task(self._answer(ws, msg.data))
+                self._answers.add(task)
+                task.add_done_callback(self._answers.discard)
+        finally:
+            self._clients.discard(ws)
+
+        return ws
+
+    async def _answer(self, ws: web.WebSocketResponse, request: str) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        method, _, path = request.partition(":")
+        if method == "GET" and path == "all":
+            await self._send(ws, json.dumps({"all": self.data}))
+            return
+
+        match = _NODE_PATH.match(path)
+        if match is None:
+            _LOGGER.debug("Ignoring unsupported request %s", request)
+            return
+
+        node_id, attribute_id, query = match.groups()
+        node = self._nodes.get(int(node_id))
+        attribute = self._attributes.get(int(attribute_id)) if attribute_id else None
+        if node is None or (attribute_id and attribute is None):
+            return
+
+        if method == "GET":
+            if attribute is not None:
+                await self._send(ws, json.dumps({"attribute": attribute}))
+            else:
+                await self._send(ws, json.dumps({"node": node}))
+        elif method == "PUT" and attribute is not None:
+            params = parse_qs(query or "")
+            if "target_value" not in params:
+                return
+            value = float(params["target_value"][0])
+            attribute["target_value"] = value
+            await self.broadcast({"attribute": attribute})
+            # Devices confirm the new value some time later.
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            await self.set_attribute(attribute["id"], value)
+
+    async def _push_updates(self) -> None:
+        if self.updates is not None:
+            await self._replay_updates()
+            return
+
+        tick = 0.01
+        due = 0.0
+        while True:
+            await asyncio.sleep(tick)
+            if self.update_rate <= 0 or not self._sensors or not self._clients:
+                due = 0.0
+                continue
+
+            due += self.update_rate * tick
+            while due >= 1:
+                due -= 1
+                attribute = self._random.choice(self._sensors)
+                value = self._random.uniform(attribute["minimum"], attribute["maximum"])
+                step = attribute["step_value"] or 1
+                value = round(round(value / step) * step, 2)
+                await self.set_attribute(attribute["id"], value)
+
+    async def _replay_updates(self) -> None:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for offset, msg in self.updates:
+            delay = started + offset - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            update = msg["attribute"]
+            attribute = self._attributes.get(update["id"])
+            if attribute is None:
+                continue
+            # HomeGenerator streams update the attributes of the served data
+            # before yielding, so the current value may already be the new one.
+            last_value = update.get("last_value", attribute["current_value"])
+            await self.set_attribute(update["id"], update["current_value"], last_value)
+
+    async def __aenter__(self):
+        """Start the server when entering the context."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Stop the server when leaving the context."""
+        await self.stop()
+
+
+async def _main(args: argparse.Namespace) -> None:
+    data = updates = None
+    if args.nodes:
+        home = generator.HomeGenerator(args.nodes, seed=args.seed or 0)
+        data = home.all()
+        # A fixed --update-rate replaces the realistic update stream.
+        if not args.update_rate:
+            updates = home.update_stream()
+
+    server = FakeHomeeServer(
+        data,
+        user=args.user,
+        password=args.password,
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        update_rate=args.update_rate,
+        seed=args.seed,
+        updates=updates,
+    )
+    async with server:
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake homee cube.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7681)
+    parser.add_argument("--user", default="homee")
+    parser.add_argument("--password", default="homee")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument(
+        "--update-rate",
+        type=float,
+        default=0.0,
+        help="random attribute updates per second, instead of the update stream of --nodes",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--nodes",
+        type=int,
+        default=0,
+        help="serve a generated installation with this many nodes",
+    )
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
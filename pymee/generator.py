@@ -0,0 +1,561 @@
+"""Generator for synthetic homee installations and attribute update streams.
+
+Useful as realistic test data for benchmarks and the fake server. All output
+is derived from a seed and therefore reproducible.
+"""
+
+from collections.abc import Iterator
+import random
+import time
+from urllib.parse import quote
+
+from .const import (
+    AttributeType,
+    DeviceApp,
+    DeviceOS,
+    DeviceType,
+    GroupCategory,
+    NodeProfile,
+    NodeProtocol,
+    NodeState,
+    UserRole,
+)
+
+# Attribute type -> (minimum, maximum, unit, step value, editable, default value)
+ATTRIBUTE_SPECS: dict[AttributeType, tuple] = {
+    AttributeType.ON_OFF: (0, 1, "", 1, True, 0),
+    AttributeType.DIMMING_LEVEL: (0, 100, "%", 1, True, 0),
+    AttributeType.CURRENT_ENERGY_USE: (0, 3680, "W", 0.1, False, 0),
+    AttributeType.ACCUMULATED_ENERGY_USE: (0, 1000000, "kWh", 0.01, False, 0),
+    AttributeType.TEMPERATURE: (-20, 60, "°C", 0.1, False, 21),
+    AttributeType.TARGET_TEMPERATURE: (4, 30, "°C", 0.5, True, 21),
+    AttributeType.RELATIVE_HUMIDITY: (0, 100, "%", 1, False, 45),
+    AttributeType.BATTERY_LEVEL: (0, 100, "%", 1, False, 100),
+    AttributeType.BRIGHTNESS: (0, 100000, "lx", 1, False, 300),
+    AttributeType.OPEN_CLOSE: (0, 1, "", 1, False, 0),
+    AttributeType.POSITION: (0, 100, "%", 1, True, 0),
+    AttributeType.UP_DOWN: (0, 4, "", 1, True, 0),
+    AttributeType.SMOKE_ALARM: (0, 1, "", 1, False, 0),
+    AttributeType.FLOOD_ALARM: (0, 1, "", 1, False, 0),
+    AttributeType.MOTION_ALARM: (0, 1, "", 1, False, 0),
+    AttributeType.TAMPER_ALARM: (0, 1, "", 1, False, 0),
+    AttributeType.CURRENT_VALVE_POSITION: (0, 100, "%", 1, False, 0),
+    AttributeType.CO2LEVEL: (0, 5000, "ppm", 1, False, 450),
+    AttributeType.COLOR_TEMPERATURE: (2000, 6500, "K", 1, True, 2700),
+    AttributeType.BUTTON_STATE: (0, 1, "", 1, False, 0),
+}
+
+# Node profile -> (attribute types, protocols)
+PROFILE_SPECS: dict[NodeProfile, tuple[tuple, tuple]] = {
+    NodeProfile.DIMMABLE_LIGHT: (
+        (AttributeType.ON_OFF, AttributeType.DIMMING_LEVEL),
+        (NodeProtocol.ZIG_BEE,),
+    ),
+    NodeProfile.DIMMABLE_COLOR_TEMPERATURE_LIGHT: (
+        (
+            AttributeType.ON_OFF,
+            AttributeType.DIMMING_LEVEL,
+            AttributeType.COLOR_TEMPERATURE,
+        ),
+        (NodeProtocol.ZIG_BEE,),
+    ),
+    NodeProfile.METERING_PLUG: (
+        (
+            AttributeType.ON_OFF,
+            AttributeType.CURRENT_ENERGY_USE,
+            AttributeType.ACCUMULATED_ENERGY_USE,
+        ),
+        (NodeProtocol.ZWAVE, NodeProtocol.ZIG_BEE),
+    ),
+    NodeProfile.WIFI_ON_OFF_METERING_PLUG: (
+        (
+            AttributeType.ON_OFF,
+            AttributeType.CURRENT_ENERGY_USE,
+            AttributeType.ACCUMULATED_ENERGY_USE,
+        ),
+        (NodeProtocol.MQTT_SHELLY,),
+    ),
+    NodeProfile.RADIATOR_THERMOSTAT: (
+        (
+            AttributeType.TEMPERATURE,
+            AttributeType.TARGET_TEMPERATURE,
+            AttributeType.CURRENT_VALVE_POSITION,
+            AttributeType.BATTERY_LEVEL,
+        ),
+        (NodeProtocol.ZWAVE, NodeProtocol.ZIG_BEE),
+    ),
+    NodeProfile.ROOM_THERMOSTAT_WITH_HUMIDITY_SENSOR: (
+        (
+            AttributeType.TEMPERATURE,
+            AttributeType.TARGET_TEMPERATURE,
+            AttributeType.RELATIVE_HUMIDITY,
+        ),
+        (NodeProtocol.ZWAVE, NodeProtocol.EN_OCEAN),
+    ),
+    NodeProfile.ELECTRIC_MOTOR_METERING_SWITCH: (
+        (
+            AttributeType.UP_DOWN,
+            AttributeType.POSITION,
+            AttributeType.CURRENT_ENERGY_USE,
+            AttributeType.ACCUMULATED_ENERGY_USE,
+        ),
+        (NodeProtocol.ZWAVE,),
+    ),
+    NodeProfile.OPEN_CLOSE_AND_TEMPERATURE_SENSOR: (
+        (
+            AttributeType.OPEN_CLOSE,
+            AttributeType.TEMPERATURE,
+            AttributeType.BATTERY_LEVEL,
+        ),
+        (NodeProtocol.ZIG_BEE, NodeProtocol.ZWAVE),
+    ),
+    NodeProfile.MOTION_DETECTOR_WITH_TEMPERATURE_AND_BRIGHTNESS_SENSOR: (
+        (
+            AttributeType.MOTION_ALARM,
+            AttributeType.TEMPERATURE,
+            AttributeType.BRIGHTNESS,
+            AttributeType.BATTERY_LEVEL,
+            AttributeType.TAMPER_ALARM,
+        ),
+        (NodeProtocol.ZWAVE, NodeProtocol.ZIG_BEE),
+    ),
+    NodeProfile.SMOKE_DETECTOR: (
+        (AttributeType.SMOKE_ALARM, AttributeType.BATTERY_LEVEL),
+        (NodeProtocol.ZWAVE,),
+    ),
+    NodeProfile.FLOOD_DETECTOR: (
+        (AttributeType.FLOOD_ALARM, AttributeType.BATTERY_LEVEL),
+        (NodeProtocol.ZWAVE,),
+    ),
+    NodeProfile.CO2SENSOR: (
+        (
+            AttributeType.CO2LEVEL,
+            AttributeType.TEMPERATURE,
+            AttributeType.RELATIVE_HUMIDITY,
+        ),
+        (NodeProtocol.ZIG_BEE,),
+    ),
+    NodeProfile.ENERGY_METER: (
+        (AttributeType.CURRENT_ENERGY_USE, AttributeType.ACCUMULATED_ENERGY_USE),
+        (NodeProtocol.ZWAVE,),
+    ),
+    NodeProfile.FOUR_BUTTON_REMOTE: (
+        (
+            AttributeType.BUTTON_STATE,
+            AttributeType.BUTTON_STATE,
+            AttributeType.BUTTON_STATE,
+            AttributeType.BUTTON_STATE,
+            AttributeType.BATTERY_LEVEL,
+        ),
+        (NodeProtocol.ZIG_BEE,),
+    ),
+}
+
+# Share of each profile in a typical commercial building.
+COMMERCIAL_BUILDING: dict[NodeProfile, float] = {
+    NodeProfile.DIMMABLE_LIGHT: 0.30,
+    NodeProfile.DIMMABLE_COLOR_TEMPERATURE_LIGHT: 0.10,
+    NodeProfile.METERING_PLUG: 0.10,
+    NodeProfile.WIFI_ON_OFF_METERING_PLUG: 0.04,
+    NodeProfile.RADIATOR_THERMOSTAT: 0.12,
+    NodeProfile.ROOM_THERMOSTAT_WITH_HUMIDITY_SENSOR: 0.04,
+    NodeProfile.ELECTRIC_MOTOR_METERING_SWITCH: 0.10,
+    NodeProfile.OPEN_CLOSE_AND_TEMPERATURE_SENSOR: 0.08,
+    NodeProfile.MOTION_DETECTOR_WITH_TEMPERATURE_AND_BRIGHTNESS_SENSOR: 0.06,
+    NodeProfile.SMOKE_DETECTOR: 0.03,
+    NodeProfile.FLOOD_DETECTOR: 0.01,
+    NodeProfile.CO2SENSOR: 0.01,
+    NodeProfile.ENERGY_METER: 0.005,
+    NodeProfile.FOUR_BUTTON_REMOTE: 0.005,
+}
+
+# Updates per second of a single attribute of each type in steady state.
+DEFAULT_UPDATE_RATES: dict[AttributeType, float] = {
+    AttributeType.CURRENT_ENERGY_USE: 1 / 10,
+    AttributeType.ACCUMULATED_ENERGY_USE: 1 / 60,
+    AttributeType.TEMPERATURE: 1 / 300,
+    AttributeType.RELATIVE_HUMIDITY: 1 / 300,
+    AttributeType.BRIGHTNESS: 1 / 60,
+    AttributeType.CO2LEVEL: 1 / 60,
+    AttributeType.MOTION_ALARM: 1 / 120,
+    AttributeType.OPEN_CLOSE: 1 / 1800,
+    AttributeType.CURRENT_VALVE_POSITION: 1 / 600,
+    AttributeType.ON_OFF: 1 / 3600,
+    AttributeType.DIMMING_LEVEL: 1 / 3600,
+    AttributeType.POSITION: 1 / 7200,
+    AttributeType.BATTERY_LEVEL: 1 / 86400,
+}
+
+# Profile -> group category it is additionally sorted into.
+_PROFILE_CATEGORIES = {
+    NodeProfile.DIMMABLE_LIGHT: GroupCategory.LIGHT,
+    NodeProfile.DIMMABLE_COLOR_TEMPERATURE_LIGHT: GroupCategory.LIGHT,
+    NodeProfile.METERING_PLUG: GroupCategory.ENERGY,
+    NodeProfile.WIFI_ON_OFF_METERING_PLUG: GroupCategory.ENERGY,
+    NodeProfile.ENERGY_METER: GroupCategory.ENERGY,
+    NodeProfile.RADIATOR_THERMOSTAT: GroupCategory.HEATING,
+    NodeProfile.ROOM_THERMOSTAT_WITH_HUMIDITY_SENSOR: GroupCategory.HEATING,
+    NodeProfile.CO2SENSOR: GroupCategory.CLIMATE,
+    NodeProfile.ELECTRIC_MOTOR_METERING_SWITCH: GroupCategory.SHUTTER,
+    NodeProfile.OPEN_CLOSE_AND_TEMPERATURE_SENSOR: GroupCategory.DOOR_WINDOW,
+    NodeProfile.MOTION_DETECTOR_WITH_TEMPERATURE_AND_BRIGHTNESS_SENSOR: GroupCategory.ALARM,
+    NodeProfile.SMOKE_DETECTOR: GroupCategory.ALARM,
+    NodeProfile.FLOOD_DETECTOR: GroupCategory.ALARM,
+}
+
+
+def attribute(
+    attribute_id: int,
+    node_id: int,
+    attribute_type: int,
+    value: float | None = None,
+    instance: int = 0,
+    timestamp: int = 0,
+) -> dict:
+    """Return the data of an attribute of the given type."""
+    minimum, maximum, unit, step, editable, default = ATTRIBUTE_SPECS.get(
+        attribute_type, (0, 1, "", 1, False, 0)
+    )
+    value = default if value is None else value
+    return {
+        "id": attribute_id,
+        "node_id": node_id,
+        "instance": instance,
+        "minimum": minimum,
+        "maximum": maximum,
+        "current_value": value,
+        "target_value": value,
+        "last_value": value,
+        "unit": quote(unit),
+        "step_value": step,
+        "editable": int(editable),
+        "type": attribute_type,
+        "state": 1,
+        "last_changed": timestamp,
+        "changed_by": 1,
+        "changed_by_id": 0,
+        "based_on": 1,
+        "data": "",
+        "name": "",
+    }
+
+
+def node(
+    node_id: int,
+    name: str,
+    profile: int,
+    attributes: list[dict],
+    protocol: int = NodeProtocol.ZWAVE,
+    timestamp: int = 0,
+) -> dict:
+    """Return the data of a node."""
+    return {
+        "id": node_id,
+        "name": quote(name),
+        "profile": profile,
+        "image": "default",
+        "favorite": 0,
+        "order": node_id,
+        "protocol": protocol,
+        "routing": 0,
+        "state": NodeState.AVAILABLE,
+        "state_changed": timestamp,
+        "added": timestamp,
+        "history": 1,
+        "cube_type": 1,
+        "note": "",
+        "services": 0,
+        "phonetic_name": "",
+        "owner": 2,
+        "security": 0,
+        "attributes": attributes,
+    }
+
+
+def settings(name: str = "homee", uid: str = "AABBCCDDEEFF", timestamp: int = 0):
+    """Return the settings of a homee."""
+    return {
+        "address": "",
+        "city": "",
+        "zip": "",
+        "state": "",
+        "latitude": 0,
+        "longitude": 0,
+        "country": "",
+        "language": "en",
+        "remote_access": 0,
+        "beta": 0,
+        "webhooks_key": "",
+        "automatic_location_detection": 0,
+        "polling_interval": 60,
+        "timezone": "Europe%2FBerlin",
+        "enable_analytics": 0,
+        "homee_name": quote(name),
+        "LastMissingCubeNotification": "",
+        "local_ssl_enabled": False,
+        "wlan_enabled": 0,
+        "wlan_ssid": "",
+        "wlan_mode": 0,
+        "internet_access": True,
+        "lan_enabled": 1,
+        "lan_ip_address": "192.168.0.2",
+        "available_ssids": [],
+        "time": timestamp,
+        "civil_time": "",
+        "version": "2.41.0",
+        "uid": uid,
+        "cubes": [],
+        "extensions": {},
+    }
+
+
+class HomeGenerator:
+    """Build 'all' payloads and attribute update streams of synthetic installations.
+
+    Nodes are distributed over rooms (nodes_per_room) and floors
+    (rooms_per_floor). Every room is a group, and nodes are additionally
+    sorted into category groups (lights, heating, ...) per floor. The mix of
+    node profiles is taken from profiles (profile -> share).
+    """
+
+    def __init__(
+        self,
+        nodes: int = 100,
+        seed: int = 0,
+        profiles: dict[NodeProfile, float] | None = None,
+        nodes_per_room: int = 8,
+        rooms_per_floor: int = 12,
+        users: int = 3,
+        devices_per_user: int = 2,
+        name: str = "Synthetic homee",
+    ) -> None:
+        """Initialize the generator."""
+        self.node_count = nodes
+        self.seed = seed
+        self.profiles = profiles or COMMERCIAL_BUILDING
+        self.nodes_per_room = nodes_per_room
+        self.rooms_per_floor = rooms_per_floor
+        self.users = users
+        self.devices_per_user = devices_per_user
+        self.name = name
+        # Fixed timestamp so the output only depends on the seed.
+        self.timestamp = 1700000000 + seed
+        self._all: dict = None
+
+    def all(self) -> dict:
+        """Return the content of an 'all' message. Generated once, then cached."""
+        if self._all is None:
+            self._all = self._generate()
+        return self._all
+
+    def _generate(self) -> dict:
+        rng = random.Random(self.seed)
+        profiles = list(self.profiles)
+        weights = list(self.profiles.values())
+        ts = self.timestamp
+
+        nodes = []
+        attribute_id = 1
+        for node_id in range(1, self.node_count + 1):
+            profile = rng.choices(profiles, weights)[0]
+            attribute_types, protocols = PROFILE_SPECS[profile]
+            attributes = []
+            instances: dict[int, int] = {}
+            for attribute_type in attribute_types:
+                instance = instances.get(attribute_type, -1) + 1
+                instances[attribute_type] = instance
+                attributes.append(
+                    attribute(attribute_id, node_id, attribute_type, None, instance, ts)
+                )
+                attribute_id += 1
+            name = f"{profile.name.replace('_', ' ').title()} {node_id}"
+            nodes.append(
+                node(node_id, name, profile, attributes, rng.choice(protocols), ts)
+            )
+
+        groups = []
+        relationships = []
+
+        def add_group(name: str, category: int) -> int:
+            group_id = len(groups) + 1
+            groups.append(
+                {
+                    "id": group_id,
+                    "name": quote(name),
+                    "image": "default",
+                    "order": group_id,
+                    "added": ts,
+                    "state": 1,
+                    "category": category,
+                    "phonetic_name": "",
+                    "note": "",
+                    "services": 0,
+                    "owner": 2,
+                }
+            )
+            return group_id
+
+        def relate(node_id: int, group_id: int) -> None:
+            relationships.append(
+                {
+                    "id": len(relationships) + 1,
+                    "group_id": group_id,
+                    "node_id": node_id,
+                    "homeegram_id": 0,
+                    "order": len(relationships),
+                }
+            )
+
+        category_groups: dict[tuple[int, int], int] = {}
+        room_group = 0
+        for index, node_data in enumerate(nodes):
+            room = index // self.nodes_per_room
+            floor = room // self.rooms_per_floor
+            if index % self.nodes_per_room == 0:
+                room_group = add_group(
+                    f"Floor {floor} Room {room % self.rooms_per_floor}",
+                    GroupCategory.NONE,
+                )
+            relate(node_data["id"], room_group)
+
+            category = _PROFILE_CATEGORIES.get(node_data["profile"])
+            if category is not None:
+                key = (floor, category)
+                if key not in category_groups:
+                    category_groups[key] = add_group(
+                        f"Floor {floor} {GroupCategory(category).name.title()}",
+                        category,
+                    )
+                relate(node_data["id"], category_groups[key])
+
+        users = []
+        device_id = 1
+        for user_id in range(1, self.users + 1):
+            devices = []
+            for _ in range(self.devices_per_user):
+                devices.append(
+                    {
+                        "id": device_id,
+                        "user_id": user_id,
+                        "hardware_id": f"{rng.getrandbits(48):012x}",
+                        "name": quote(f"Device {device_id}"),
+                        "added": ts,
+                        "last_connected": ts,
+                        "os": rng.choice([DeviceOS.I_OS, DeviceOS.ANDROID]),
+                        "type": DeviceType.PHONE,
+                        "app": DeviceApp.HOMEE,
+                        "connected": rng.randint(0, 1),
+                        "push_registration_id": "",
+                    }
+                )
+                device_id += 1
+            users.append(
+                {
+                    "id": user_id,
+                    "username": f"user{user_id}",
+                    "forename": "User",
+                    "surname": str(user_id),
+                    "image": "",
+                    "role": UserRole.ADMIN if user_id == 1 else UserRole.STANDARD,
+                    "type": 1,
+                    "email": f"user{user_id}@example.com",
+                    "phone": "",
+                    "added": ts,
+                    "homee_image": "",
+                    "access": 1,
+                    "presence_detection": False,
+                    "cube_push_notifications": 1,
+                    "cube_email_notifications": 0,
+                    "cube_sms_notifications": 0,
+                    "warning_push_notifications": 1,
+                    "warning_push_notifications_as_critical": 0,
+                    "warning_email_notifications": 0,
+                    "warning_sms_notifications": 0,
+                    "node_push_notifications": 1,
+                    "node_email_notifications": 0,
+                    "node_sms_notifications": 0,
+                    "update_push_notifications": 1,
+                    "update_email_notifications": 0,
+                    "update_sms_notifications": 0,
+                    "homeegram_push_notifications": 1,
+                    "homeegram_email_notifications": 0,
+                    "homeegram_sms_notifications": 0,
+                    "api_push_notifications": 0,
+                    "api_email_notifications": 0,
+                    "api_sms_notifications": 0,
+                    "plan_push_notifications": 0,
+                    "plan_email_notifications": 0,
+                    "plan_sms_notifications": 0,
+                    "watchdog_push_notifications": 0,
+                    "watchdog_email_notifications": 0,
+                    "watchdog_sms_notifications": 0,
+                    "devices": devices,
+                }
+            )
+
+        return {
+            "settings": settings(self.name, f"{rng.getrandbits(48):012X}", ts),
+            "nodes": nodes,
+            "groups": groups,
+            "relationships": relationships,
+            "users": users,
+            "homeegrams": [],
+            "plans": [],
+        }
+
+    def update_stream(
+        self, rates: dict[int, float] | None = None, seed: int | None = None
+    ) -> Iterator[tuple[float, dict]]:
+        """Yield (seconds since start, 'attribute' message) of a steady state update stream.
+
+        rates maps attribute types to updates per second of a single attribute.
+        The stream is endless and updates the attributes of all() as it goes.
+        """
+        rates = DEFAULT_UPDATE_RATES if rates is None else rates
+        rng = random.Random(self.seed if seed is None else seed)
+
+        by_type: dict[int, list[dict]] = {}
+        for node_data in self.all()["nodes"]:
+            for attribute_data in node_data["attributes"]:
+                if rates.get(attribute_data["type"], 0) > 0:
+                    by_type.setdefault(attribute_data["type"], []).append(
+                        attribute_data
+                    )
+        if not by_type:
+            return
+
+        types = list(by_type)
+        # Combined rate of all attributes of a type.
+        weights = [rates[t] * len(by_type[t]) for t in types]
+        total = sum(weights)
+
+        elapsed = 0.0
+        while True:
+            elapsed += rng.expovariate(total)
+            attribute_type = rng.choices(types, weights)[0]
+            attribute_data = rng.choice(by_type[attribute_type])
+            self._step(rng, attribute_data)
+            attribute_data["last_changed"] = self.timestamp + int(elapsed)
+            yield elapsed, {"attribute": dict(attribute_data)}
+
+    @staticmethod
+    def _step(rng: random.Random, attribute_data: dict) -> None:
+        """Move an attribute to a plausible next value."""
+        minimum = attribute_data["minimum"]
+        maximum = attribute_data["maximum"]
+        step = attribute_data["step_value"] or 1
+        value = attribute_data["current_value"]
+
+        if maximum - minimum <= 1:
+            new_value = maximum if value == minimum else minimum
+        elif attribute_data["type"] == AttributeType.ACCUMULATED_ENERGY_USE:
+            new_value = min(maximum, value + rng.uniform(0, 0.05))
+        else:
+            # Random walk of up to 5 % of the range.
+            delta = rng.gauss(0, (maximum - minimum) * 0.05)
+            new_value = min(maximum, max(minimum, value + delta))
+
+        new_value = round(round(new_value / step) * step, 2)
+        attribute_data["last_value"] = value
+        attribute_data["current_value"] = new_value
+        attribute_data["target_value"] = new_value
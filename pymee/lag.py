@@ -0,0 +1,110 @@
+"""Monitoring of the event loop lag."""
+
+import asyncio
+from collections import deque
+from collections.abc import Awaitable, Callable
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def log_lag_spike(lag: float, msg_type: str | None, duration: float) -> None:
+    """Log a lag spike reported by LoopLagMonitor.run()."""
+    if msg_type is not None:
+        _LOGGER.warning(
+            "Event loop lagged %.0f ms, handling a '%s' message took %.0f ms",
+            lag * 1000,
+            msg_type,
+            duration * 1000,
+        )
+    else:
+        _LOGGER.warning(
+            "Event loop lagged %.0f ms outside of message handling", lag * 1000
+        )
+
+
+class LoopLagMonitor:
+    """Measure how late the event loop wakes up a sleeping task.
+
+    A lag that stays high means the process was blocked (i.e. by a slow
+    callback) and could not read from the websocket in time, which often looks
+    like a network or cube problem. The monitor remembers the slowest message
+    handled between two samples, so lag spikes can be blamed on a message type.
+    """
+
+    def __init__(
+        self, interval: float = 0.5, threshold: float = 0.1, window: int = 1200
+    ) -> None:
+        """Initialize the monitor.
+
+        Samples every interval seconds, keeps the last window samples and
+        reports lags above threshold seconds.
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.samples: deque[float] = deque(maxlen=window)
+        self.spikes = 0
+        # Called with every sample, i.e. to feed a histogram.
+        self.observer: Callable[[float], None] | None = None
+        self._slowest = 0.0
+        # Only the type is kept, holding on to the message would keep i.e. a
+        # whole 'all' message alive until the next sample.
+        self._slowest_type: str = None
+
+    def note(self, msg: dict, duration: float) -> None:
+        """Remember how long handling a message took."""
+        if duration > self._slowest:
+            self._slowest = duration
+            self._slowest_type = next(iter(msg), None)
+
+    async def run(
+        self, on_spike: Callable[[float, str | None, float], Awaitable] | None = None
+    ) -> None:
+        """Sample until cancelled.
+
+        on_spike(lag, message type, seconds spent handling it) is awaited for
+        every sample above the threshold. The message type is None if no
+        message handling was slow enough to explain the lag.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            self._slowest = 0.0
+            self._slowest_type = None
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self.samples.append(lag)
+            if self.observer is not None:
+                self.observer(lag)
+
+            if lag < self.threshold:
+                continue
+
+            self.spikes += 1
+            msg_type = None
+            # Only blame a message that blocked for a good part of the lag.
+            if self._slowest_type is not None and self._slowest >= lag / 2:
+                msg_type = self._slowest_type
+            if on_spike is not None:
+                await on_spike(lag, msg_type, self._slowest)
+
+    def percentile(self, percent: float) -> float:
+        """Return the given percentile (0-100) of the recent samples."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+    def percentiles(self) -> dict[str, float]:
+        """Return the median, 90th and 99th percentile and maximum of the recent samples."""
+        if not self.samples:
+            return {"p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+        ordered = sorted(self.samples)
+        last = len(ordered) - 1
+        return {
+            "p50": ordered[min(last, int(len(ordered) * 0.5))],
+            "p90": ordered[min(last, int(len(ordered) * 0.9))],
+            "p99": ordered[min(last, int(len(ordered) * 0.99))],
+            "max": ordered[-1],
+        }
@@ -0,0 +1,93 @@
+"""Registry for listener callbacks with O(1) removal and optional weak references."""
+
+from collections.abc import Callable, Iterator
+import inspect
+import itertools
+import weakref
+
+
+class ListenerHandle:
+    """Handle of a registered listener.
+
+    Calling the handle removes the listener, so it can be used like the remove
+    function returned by older versions of add_on_changed_listener().
+    """
+
+    __slots__ = ("_registry", "_key")
+
+    def __init__(self, registry, key: int) -> None:
+        """Initialize the handle."""
+        self._registry = registry
+        self._key = key
+
+    @property
+    def active(self) -> bool:
+        """Whether the listener is still registered."""
+        return self._key in self._registry._listeners
+
+    def remove(self) -> None:
+        """Remove the listener. Does nothing if it was already removed."""
+        self._registry._listeners.pop(self._key, None)
+
+    def __call__(self) -> None:
+        """Remove the listener."""
+        self.remove()
+
+
+class ListenerRegistry:
+    """Ordered collection of listeners.
+
+    Listeners are kept in the order they were added. Weakly referenced
+    listeners are removed automatically once their owner is garbage collected.
+    """
+
+    __slots__ = ("_listeners", "_keys", "__weakref__")
+
+    def __init__(self) -> None:
+        """Initialize an empty registry."""
+        # Maps key -> (listener or weak reference to it, is weak reference).
+        self._listeners: dict[int, tuple[Callable, bool]] = {}
+        self._keys = itertools.count()
+
+    def __len__(self) -> int:
+        """Return the number of registered listeners."""
+        return len(self._listeners)
+
+    def __iter__(self) -> Iterator[Callable]:
+        """Iterate over a snapshot of the live listeners."""
+        for listener, weak in tuple(self._listeners.values()):
+            if weak:
+                listener = listener()
+                if listener is None:
+                    continue
+            yield listener
+
+    def add(self, listener: Callable, weak: bool = False) -> ListenerHandle:
+        """Register a listener and return its handle.
+
+        With weak=True, only a weak reference to the listener (or for bound
+        methods to their instance) is kept.
+        """
+        key = next(self._keys)
+        if weak:
+            # Don't keep the registry alive through the reference callback.
+            registry = weakref.ref(self)
+
+            def _on_collected(_ref):
+                owner = registry()
+                if owner is not None:
+                    owner._listeners.pop(key, None)
+
+            if inspect.ismethod(listener):
+                ref = weakref.WeakMethod(listener, _on_collected)
+            else:
+                ref = weakref.ref(listener, _on_collected)
+            self._listeners[key] = (ref, True)
+        else:
+            self._listeners[key] = (listener, False)
+
+        return ListenerHandle(self, key)
+
+    def clear(self) -> None:
+        """Remove all listeners."""
+        self._listeners.clear()
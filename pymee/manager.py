@@ -0,0 +1,242 @@
+"""Run many Homee connections on a single event loop."""
+
+import asyncio
+from collections.abc import Iterator
+import logging
+
+import aiohttp
+
+from . import Homee
+from .lag import LoopLagMonitor, log_lag_spike
+from .metrics import render_prometheus
+from .offload import Offloader
+from .outbound import ClosePolicy
+from .timer import TimerWheel
+
+_LOGGER = logging.getLogger(__name__)
+
+# Homee arguments the manager passes itself, to share its resources.
+_SHARED_ARGUMENTS = ("session", "timer_wheel", "offloader", "lag_interval")
+
+
+class HomeeManager:
+    """Own and run many Homee instances that share their infrastructure.
+
+    All instances share one pooled HTTP session, one timer wheel, one
+    offloader and one event loop lag monitor, so the overhead per connection
+    stays small.
+    """
+
+    def __init__(
+        self,
+        homee_class: type[Homee] = Homee,
+        session: aiohttp.ClientSession | None = None,
+        connection_limit: int = 100,
+        lag_interval: float | None = None,
+        lag_threshold: float = 0.1,
+        **homee_kwargs,
+    ) -> None:
+        """Initialize the manager.
+
+        homee_kwargs are used as defaults for every instance created with add().
+        If no session is given, the manager creates (and closes) its own. With a
+        lag_interval, one event loop lag monitor reports to all instances.
+        """
+        _check_arguments(homee_kwargs)
+        self.homee_class = homee_class
+        self.connection_limit = connection_limit
+        self.homee_kwargs = homee_kwargs
+        self.timer_wheel = TimerWheel()
+        self.offloader = Offloader()
+        self.lag_monitor: LoopLagMonitor = None
+        if lag_interval:
+            self.lag_monitor = LoopLagMonitor(lag_interval, lag_threshold)
+            self.lag_monitor.observer = self._observe_lag
+        self._lag_task: asyncio.Task = None
+
+        self._session = session
+        self._owns_session = session is None
+        self._instances: dict[str, Homee] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._running = False
+
+    def __len__(self) -> int:
+        """Return the number of managed instances."""
+        return len(self._instances)
+
+    def __iter__(self) -> Iterator[Homee]:
+        """Iterate over the managed instances."""
+        return iter(list(self._instances.values()))
+
+    def __contains__(self, key: str) -> bool:
+        """Return whether an instance with the given key is managed."""
+        return key in self._instances
+
+    def __getitem__(self, key: str) -> Homee:
+        """Return the instance with the given key."""
+        return self._instances[key]
+
+    @property
+    def session(self) -> aiohttp.ClientSession | None:
+        """The HTTP session shared by all instances."""
+        return self._session
+
+    def add(self, key: str, host: str, user: str, password: str, **kwargs) -> Homee:
+        """Create a managed Homee instance. It is started right away if the manager runs."""
+        if key in self._instances:
+            raise ValueError(f"A Homee with key {key} already exists")
+
+        _check_arguments(kwargs)
+        homee = self.homee_class(
+            host,
+            user,
+            password,
+            **{
+                **self.homee_kwargs,
+                **kwargs,
+                "session": self._session,
+                "timer_wheel": self.timer_wheel,
+                "offloader": self.offloader,
+                "lag_interval": None,
+            },
+        )
+        homee.lag_monitor = self.lag_monitor
+        self._instances[key] = homee
+
+        if self._running:
+            self._start(key, homee)
+
+        return homee
+
+    async def remove(self, key: str) -> None:
+        """Disconnect and remove the instance with the given key."""
+        homee = self._instances.pop(key)
+        homee.disconnect()
+        task = self._tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def start(self) -> None:
+        """Start all instances on the running loop."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connection_limit)
+            )
+            self._owns_session = True
+
+        self._running = True
+        if self.lag_monitor is not None and self._lag_task is None:
+            self._lag_task = asyncio.create_task(
+                self.lag_monitor.run(self._on_lag_spike)
+            )
+        for key, homee in self._instances.items():
+            if key not in self._tasks:
+                self._start(key, homee)
+
+    async def stop(
+        self, policy: ClosePolicy = ClosePolicy.FLUSH, timeout: float = 5.0
+    ) -> None:
+        """Close all instances (see Homee.close()) and release the shared resources."""
+        self._running = False
+        await asyncio.gather(
+            *(homee.close(policy, timeout) for homee in self._instances.values()),
+            return_exceptions=True,
+        )
+
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        if self._lag_task is not None:
+            tasks.append(self._lag_task)
+            self._lag_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.timer_wheel.close()
+        self.offloader.shutdown()
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def wait_until_connected(self) -> None:
+        """Wait until every managed instance is connected."""
+        await asyncio.gather(
+            *(homee.wait_until_connected() for homee in self._instances.values())
+        )
+
+    def stats(self) -> dict:
+        """Return aggregated numbers over all managed instances."""
+        connected = sum(1 for homee in self._instances.values() if homee.connected)
+        return {
+            "instances": len(self._instances),
+            "running": sum(1 for task in self._tasks.values() if not task.done()),
+            "connected": connected,
+            "disconnected": len(self._instances) - connected,
+            "retries": sum(homee.retries for homee in self._instances.values()),
+            "nodes": sum(len(homee.nodes) for homee in self._instances.values()),
+            "listeners": sum(
+                sum(homee.listener_counts().values())
+                for homee in self._instances.values()
+            ),
+            "timers": len(self.timer_wheel),
+            "loop_lag": (
+                self.lag_monitor.percentiles() if self.lag_monitor is not None else {}
+            ),
+        }
+
+    def _observe_lag(self, lag: float) -> None:
+        for homee in self._instances.values():
+            if homee.metrics is not None:
+                homee.metrics.loop_lag.observe(lag)
+
+    async def _on_lag_spike(self, lag: float, msg_type: str | None, duration: float):
+        # The loop is shared, so the spike is logged once and reported to all.
+        log_lag_spike(lag, msg_type, duration)
+        await asyncio.gather(
+            *(homee.on_loop_lag(lag, msg_type) for homee in self._instances.values()),
+            return_exceptions=True,
+        )
+
+    def render_metrics(self) -> str:
+        """Render the metrics of all instances created with metrics=True.
+
+        Samples are labelled with the key of their instance.
+        """
+        return render_prometheus(
+            *(
+                (homee.metrics.registry, {"cube": key})
+                for key, homee in self._instances.items()
+                if homee.metrics is not None
+            )
+        )
+
+    def _start(self, key: str, homee: Homee) -> None:
+        homee.session = self._session
+        task = asyncio.create_task(homee.run(), name=f"homee-{key}")
+        task.add_done_callback(lambda t: self._on_done(key, t))
+        self._tasks[key] = task
+
+    def _on_done(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled() and task.exception() is not None:
+            _LOGGER.error("Homee %s stopped with an error: %s", key, task.exception())
+
+    async def __aenter__(self):
+        """Start all instances when entering the context."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Stop all instances when leaving the context."""
+        await self.stop()
+
+
+def _check_arguments(kwargs: dict) -> None:
+    shared = [name for name in _SHARED_ARGUMENTS if name in kwargs]
+    if shared:
+        raise ValueError(
+            f"{', '.join(shared)} can't be set per instance, "
+            "they are shared by the HomeeManager"
+        )
@@ -0,0 +1,395 @@
+"""Metrics of Homee instances and their exposition in the Prometheus text format."""
+
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Iterator
+import time
+from typing import TYPE_CHECKING
+
+from aiohttp import web
+
+if TYPE_CHECKING:
+    from . import Homee
+
+# Seconds, from 50 microseconds up to 10 seconds.
+DEFAULT_BUCKETS = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """Base class of all metrics."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()) -> None:
+        """Initialize the metric with the names of its labels."""
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def samples(self) -> Iterator[tuple[str, dict, float]]:
+        """Yield (name, labels, value) of all samples."""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()) -> None:
+        """Initialize the counter."""
+        super().__init__(name, documentation, labels)
+        # Counters without labels are exported as 0 before their first increment.
+        self._values: dict[tuple, float] = {} if labels else {(): 0.0}
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        """Increase the counter for the given label values."""
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def get(self, *labels) -> float:
+        """Return the value for the given label values."""
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterator[tuple[str, dict, float]]:
+        """Yield (name, labels, value) of all samples."""
+        for labels, value in self._values.items():
+            yield self.name, dict(zip(self.labels, labels)), value
+
+
+class Gauge(Metric):
+    """A value that can go up and down, or is read from a function on collection."""
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple = (),
+        function: Callable[[], float] | None = None,
+    ) -> None:
+        """Initialize the gauge. A gauge with a function can't have labels."""
+        super().__init__(name, documentation, labels)
+        self.function = function
+        self._values: dict[tuple, float] = {}
+
+    def set(self, value: float, *labels) -> None:
+        """Set the value for the given label values."""
+        self._values[labels] = value
+
+    def get(self, *labels) -> float:
+        """Return the value for the given label values."""
+        if self.function is not None:
+            return self.function()
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> Iterator[tuple[str, dict, float]]:
+        """Yield (name, labels, value) of all samples."""
+        if self.function is not None:
+            yield self.name, {}, self.function()
+            return
+        for labels, value in self._values.items():
+            yield self.name, dict(zip(self.labels, labels)), value
+
+
+class Histogram(Metric):
+    """Counts observations in buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        """Initialize the histogram with the upper bounds of its buckets."""
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Label values -> [bucket counts..., sum, count]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        """Add an observation for the given label values."""
+        data = self._values.get(labels)
+        if data is None:
+            data = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        # Values above the largest bound only count towards +Inf.
+        data[bisect_left(self.buckets, value)] += 1
+        data[-2] += value
+        data[-1] += 1
+
+    def count(self, *labels) -> int:
+        """Return the number of observations for the given label values."""
+        data = self._values.get(labels)
+        return data[-1] if data is not None else 0
+
+    def samples(self) -> Iterator[tuple[str, dict, float]]:
+        """Yield (name, labels, value) of all samples."""
+        for labels, data in self._values.items():
+            labels = dict(zip(self.labels, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), data):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    {**labels, "le": _format_value(bound)},
+                    cumulative,
+                )
+            yield f"{self.name}_sum", labels, data[-2]
+            yield f"{self.name}_count", labels, data[-1]
+
+
+class MetricsRegistry:
+    """A collection of metrics."""
+
+    def __init__(self) -> None:
+        """Initialize an empty registry."""
+        self._metrics: dict[str, Metric] = {}
+
+    def __iter__(self) -> Iterator[Metric]:
+        """Iterate over all metrics."""
+        return iter(list(self._metrics.values()))
+
+    def __getitem__(self, name: str) -> Metric:
+        """Return the metric with the given name."""
+        return self._metrics[name]
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric to the registry and return it."""
+        if metric.name in self._metrics:
+            raise ValueError(f"A metric named {metric.name} already exists")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple = ()) -> Counter:
+        """Create and register a counter."""
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple = (),
+        function: Callable[[], float] | None = None,
+    ) -> Gauge:
+        """Create and register a gauge."""
+        return self.register(Gauge(name, documentation, labels, function))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Create and register a histogram."""
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+
+def render_prometheus(*sources: MetricsRegistry | tuple[MetricsRegistry, dict]) -> str:
+    """Render registries in the Prometheus text exposition format.
+
+    A source can be a registry or a (registry, labels) tuple. The labels are
+    added to every sample of that registry, so several registries with the
+    same metrics (i.e. of several Homee instances) can be rendered together.
+    """
+    families: dict[str, tuple[Metric, list]] = {}
+    for source in sources:
+        registry, extra = source if isinstance(source, tuple) else (source, {})
+        for metric in registry:
+            family = families.setdefault(metric.name, (metric, []))
+            family[1].append((metric, extra))
+
+    lines = []
+    for name, (first, members) in families.items():
+        lines.append(f"# HELP {name} {_escape(first.documentation)}")
+        lines.append(f"# TYPE {name} {first.type}")
+        for metric, extra in members:
+            for sample, labels, value in metric.samples():
+                lines.append(
+                    f"{sample}{_format_labels({**extra, **labels})} "
+                    f"{_format_value(value)}"
+                )
+    return "\n".join(lines) + "\n"
+
+
+class HomeeMetrics:
+    """The metrics of a single Homee instance."""
+
+    def __init__(self, homee: "Homee", registry: MetricsRegistry | None = None):
+        """Create the metrics of homee in registry (or a new registry)."""
+        self.registry = registry if registry is not None else MetricsRegistry()
+        self.connected_since: float | None = None
+        r = self.registry
+
+        self.messages = r.counter(
+            "pymee_messages_total", "Messages received from homee.", ("type",)
+        )
+        self.message_bytes = r.counter(
+            "pymee_message_bytes_total",
+            "Bytes of the messages received from homee.",
+            ("type",),
+        )
+        self.sent_messages = r.counter(
+            "pymee_sent_messages_total", "Messages sent to homee."
+        )
+        self.sent_bytes = r.counter(
+            "pymee_sent_bytes_total", "Bytes of the messages sent to homee."
+        )
+        self.decode_seconds = r.histogram(
+            "pymee_decode_seconds", "Time spent decoding received messages."
+        )
+        self.handle_seconds = r.histogram(
+            "pymee_handle_seconds",
+            "Time spent handling decoded messages, including callbacks.",
+            ("type",),
+        )
+        self.listener_seconds = r.histogram(
+            "pymee_listener_seconds", "Time spent in node listeners per call."
+        )
+        self.auth_seconds = r.histogram(
+            "pymee_auth_seconds", "Time needed to get an access token."
+        )
+        self.loop_lag = r.histogram(
+            "pymee_loop_lag_seconds", "How late the event loop woke up a sampler."
+        )
+        self.ping_rtt = r.histogram(
+            "pymee_ping_rtt_seconds", "Round trip time of heartbeat pings."
+        )
+        self.missed_pongs = r.counter(
+            "pymee_missed_pongs_total", "Heartbeat pings that were not answered."
+        )
+        self.reconnects = r.counter("pymee_reconnects_total", "Reconnect attempts.")
+        self.throttle_seconds = r.histogram(
+            "pymee_throttle_wait_seconds",
+            "Time queued messages waited for the rate limiter.",
+        )
+        self.throttled_messages = r.counter(
+            "pymee_throttled_messages_total",
+            "Messages that had to wait for the rate limiter.",
+        )
+        self.command_seconds = r.histogram(
+            "pymee_command_seconds",
+            "Time from set_value() until homee reported the target value.",
+            ("protocol",),
+        )
+        self.command_timeouts = r.counter(
+            "pymee_command_timeouts_total",
+            "set_value() commands whose target value was not reported in time.",
+            ("protocol",),
+        )
+        r.gauge(
+            "pymee_retries",
+            "Failed connection attempts since the last successful connect.",
+            function=lambda: homee.retries,
+        )
+        r.gauge(
+            "pymee_send_queue_depth",
+            "Messages waiting to be sent.",
+            function=homee._message_queue.qsize,
+        )
+        r.gauge(
+            "pymee_connected",
+            "Whether the websocket is connected.",
+            function=lambda: int(homee.connected),
+        )
+        r.gauge(
+            "pymee_connection_uptime_seconds",
+            "Seconds since the current connection was established.",
+            function=lambda: self._uptime() if homee.connected else 0.0,
+        )
+        r.gauge("pymee_nodes", "Number of nodes.", function=lambda: len(homee.nodes))
+        r.gauge(
+            "pymee_pending_commands",
+            "set_value() commands waiting for their target value.",
+            function=lambda: len(homee.commands),
+        )
+        r.gauge(
+            "pymee_outbox_depth",
+            "Messages waiting in the outbox for a reconnect.",
+            function=lambda: len(homee.outbox) if homee.outbox is not None else 0,
+        )
+
+    def _uptime(self) -> float:
+        if self.connected_since is None:
+            return 0.0
+        return time.monotonic() - self.connected_since
+
+    def observe_message(
+        self, msg: dict, size: int, decode_time: float, handle_time: float
+    ) -> None:
+        """Record a received message."""
+        msg_type = next(iter(msg), "invalid") if isinstance(msg, dict) else "invalid"
+        self.messages.inc(msg_type)
+        self.message_bytes.inc(msg_type, amount=size)
+        self.decode_seconds.observe(decode_time)
+        self.handle_seconds.observe(handle_time, msg_type)
+
+    def observe_sent(self, msg: str) -> None:
+        """Record a message written to the websocket."""
+        self.sent_messages.inc()
+        self.sent_bytes.inc(amount=len(msg.encode("utf-8")))
+
+    def observe_listener(self, node, listener: Callable, duration: float) -> None:
+        """Record a call of a node listener."""
+        self.listener_seconds.observe(duration)
+
+    def render(self) -> str:
+        """Render the metrics in the Prometheus text format."""
+        return render_prometheus(self.registry)
+
+
+async def start_metrics_server(
+    render: Callable[[], str], host: str = "127.0.0.1", port: int = 9464
+) -> web.AppRunner:
+    """Serve the output of render at /metrics. Call cleanup() on the result to stop."""
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(
+            text=render(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -3,8 +3,10 @@
 from collections.abc import Callable
 import logging
 import regex
+import time
 from urllib.parse import unquote
 from .const import NodeProtocol, WarningCode
+from .listeners import ListenerHandle, ListenerRegistry
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -74,6 +76,9 @@ class HomeeAttribute:
     def __init__(self, data: dict) -> None:
         """Initialize the attribute."""
         self._data = data
+        # Whether current_value is the target of an optimistic set_value() that
+        # homee did not confirm yet.
+        self.pending = False
 
     @property
     def raw_data(self):
@@ -203,7 +208,7 @@ class HomeeNode:
             self.attributes.append(HomeeAttribute(a))
         self._attribute_map: dict = None
         self.remap_attributes()
-        self._on_changed_listeners = []
+        self._on_changed_listeners = ListenerRegistry()
         self.groups: list[HomeeGroup] = []
 
     @property
@@ -320,14 +325,21 @@ class HomeeNode:
         index = self.get_attribute_index(attribute_id)
         return self.attributes[index] if index != -1 else None
 
-    def add_on_changed_listener(self, listener: Callable) -> Callable:
-        """Add on_changed listener to node."""
-        self._on_changed_listeners.append(listener)
+    @property
+    def listener_count(self) -> int:
+        """Number of on_changed listeners registered on the node."""
+        return len(self._on_changed_listeners)
 
-        def remove_listener():
-            self._on_changed_listeners.remove(listener)
+    def add_on_changed_listener(
+        self, listener: Callable, weak: bool = False
+    ) -> ListenerHandle:
+        """Add on_changed listener to node.
 
-        return remove_listener
+        Returns a handle that removes the listener when called. With weak=True the
+        node only keeps a weak reference to the listener (or the instance of a
+        bound method), so the listener goes away together with its owner.
+        """
+        return self._on_changed_listeners.add(listener, weak)
 
     def _update_attribute(self, attribute_data: dict):
         # TODO: Remove in a future release.
@@ -336,13 +348,23 @@ class HomeeNode:
         )
         self.update_attribute(attribute_data)
 
-    def update_attribute(self, attribute_data: dict):
-        """Update a single attribute of a node."""
+    def update_attribute(self, attribute_data: dict, observe: Callable | None = None):
+        """Update a single attribute of a node.
+
+        If given, observe(node, listener, seconds) is called after every listener.
+        """
         attribute = self.get_attribute_by_id(attribute_data["id"])
         if attribute is not None:
             attribute.set_data(attribute_data)
+            if observe is None:
+                for listener in self._on_changed_listeners:
+                    listener(self, attribute)
+                return
+
             for listener in self._on_changed_listeners:
+                started = time.perf_counter()
                 listener(self, attribute)
+                observe(self, listener, time.perf_counter() - started)
 
     def _update_attributes(self, attributes: list[dict]):
         # TODO: Remove in a future release.
@@ -351,10 +373,12 @@ class HomeeNode:
         )
         self.update_attributes(attributes)
 
-    def update_attributes(self, attributes: list[dict]):
+    def update_attributes(
+        self, attributes: list[dict], observe: Callable | None = None
+    ):
         """Update the given attributes."""
         for attr in attributes:
-            self.update_attribute(attr)
+            self.update_attribute(attr, observe)
 
     def _remap_attributes(self):
         # TODO: Remove in a future release.
@@ -0,0 +1,184 @@
+"""Run CPU heavy listeners in thread or process pools."""
+
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from enum import IntEnum, unique
+import functools
+import logging
+from typing import NamedTuple
+
+from .model import HomeeAttribute, HomeeNode
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@unique
+class ExecutorMode(IntEnum):
+    """Where an offloaded listener runs."""
+
+    THREAD = 1
+    PROCESS = 2
+
+
+class NodeSnapshot(NamedTuple):
+    """Compact, picklable copy of the state of a node."""
+
+    id: int
+    name: str
+    profile: int
+    protocol: int
+    state: int
+
+    @classmethod
+    def from_node(cls, node: HomeeNode):
+        """Create a snapshot of the given node."""
+        data = node.raw_data
+        return cls(
+            data["id"],
+            node.name,
+            data.get("profile"),
+            data.get("protocol"),
+            data.get("state"),
+        )
+
+
+class AttributeSnapshot(NamedTuple):
+    """Compact, picklable copy of the state of an attribute."""
+
+    id: int
+    node_id: int
+    type: int
+    instance: int
+    current_value: float
+    target_value: float
+    last_value: float
+    state: int
+    last_changed: int
+
+    @classmethod
+    def from_attribute(cls, attribute: HomeeAttribute):
+        """Create a snapshot of the given attribute."""
+        data = attribute.raw_data
+        return cls(
+            data["id"],
+            data["node_id"],
+            data["type"],
+            data.get("instance"),
+            data.get("current_value"),
+            data.get("target_value"),
+            data.get("last_value"),
+            data.get("state"),
+            data.get("last_changed"),
+        )
+
+
+class Offloader:
+    """Lazily created thread and process pools for offloaded work."""
+
+    def __init__(
+        self, thread_workers: int | None = None, process_workers: int | None = None
+    ) -> None:
+        """Initialize the offloader. Pools are only created once they are used."""
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self._thread_pool: ThreadPoolExecutor = None
+        self._process_pool: ProcessPoolExecutor = None
+
+    def executor(self, mode: ExecutorMode) -> Executor:
+        """Return the pool for the given mode, creating it if necessary."""
+        if mode == ExecutorMode.PROCESS:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(self.process_workers)
+            return self._process_pool
+
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                self.thread_workers, thread_name_prefix="pymee"
+            )
+        return self._thread_pool
+
+    def submit(self, mode: ExecutorMode, func: Callable, *args) -> asyncio.Future:
+        """Run func(*args) in the pool for the given mode and return an awaitable future.
+
+        Functions and arguments run in a process pool need to be picklable.
+        """
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self.executor(mode), func, *args)
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Shut down all pools that were created."""
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=wait, cancel_futures=True)
+            self._thread_pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=wait, cancel_futures=True)
+            self._process_pool = None
+
+
+class OffloadedListener:
+    """Node listener that runs the wrapped listener in a thread or process pool.
+
+    The wrapped listener is called with a NodeSnapshot and an AttributeSnapshot
+    instead of the live objects. Each call returns a future for the listener's
+    result. If on_result is given, it is called on the event loop with
+    (node snapshot, attribute snapshot, result) once the listener finished.
+    """
+
+    def __init__(
+        self,
+        offloader: Offloader,
+        listener: Callable,
+        mode: ExecutorMode = ExecutorMode.THREAD,
+        on_result: Callable | None = None,
+    ) -> None:
+        """Initialize the offloaded listener."""
+        self.listener = listener
+        self.mode = ExecutorMode(mode)
+        self.on_result = on_result
+        self.pending: set[asyncio.Future] = set()
+        self._offloader = offloader
+
+    def __call__(self, node: HomeeNode, attribute: HomeeAttribute) -> asyncio.Future:
+        """Hand snapshots of node and attribute to the pool."""
+        node_snapshot = NodeSnapshot.from_node(node)
+        attribute_snapshot = AttributeSnapshot.from_attribute(attribute)
+        future = self._offloader.submit(
+            self.mode, self.listener, node_snapshot, attribute_snapshot
+        )
+        self.pending.add(future)
+        future.add_done_callback(
+            functools.partial(self._on_done, node_snapshot, attribute_snapshot)
+        )
+        return future
+
+    async def wait(self) -> None:
+        """Wait until all calls that are currently running have finished."""
+        if self.pending:
+            await asyncio.gather(*self.pending, return_exceptions=True)
+
+    def _on_done(
+        self,
+        node_snapshot: NodeSnapshot,
+        attribute_snapshot: AttributeSnapshot,
+        future: asyncio.Future,
+    ) -> None:
+        self.pending.discard(future)
+        if future.cancelled():
+            return
+
+        if future.exception() is not None:
+            _LOGGER.error(
+                "Error in offloaded listener %s for node %s attribute %s: %s",
+                self.listener,
+                node_snapshot.id,
+                attribute_snapshot.id,
+                future.exception(),
+            )
+            return
+
+        if self.on_result is not None:
+            try:
+                self.on_result(node_snapshot, attribute_snapshot, future.result())
+            except Exception:
+                _LOGGER.exception("Error in on_result of %s", self.listener)
@@ -0,0 +1,304 @@
+"""Handling of the messages sent to homee."""
+
+import asyncio
+from collections import deque
+from collections.abc import Hashable
+from enum import IntEnum, unique
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@unique
+class ClosePolicy(IntEnum):
+    """What happens to queued messages when a connection is closed."""
+
+    # Send the queued messages before closing, as long as the deadline allows.
+    FLUSH = 0
+    # Discard the queued messages.
+    DROP = 1
+
+
+@unique
+class Priority(IntEnum):
+    """Lanes of the send queue, lower values are sent first."""
+
+    # Commands a user waits for, i.e. set_value().
+    INTERACTIVE = 0
+    NORMAL = 1
+    # Requests that refresh data, i.e. update_node() and GET:all.
+    BACKGROUND = 2
+
+
+class PriorityMessageQueue:
+    """Queue of messages to send with one FIFO lane per priority.
+
+    The message of the highest priority lane is sent first. A lane that had
+    to wait while starvation_limit messages of higher lanes were sent gets
+    the next turn, so background requests still make progress while commands
+    keep coming in.
+
+    reserve() fixes the next message, i.e. while it waits for the rate
+    limiter. It stays queued but is returned next, regardless of messages
+    put afterwards.
+    """
+
+    def __init__(self, starvation_limit: int = 8) -> None:
+        """Initialize empty lanes."""
+        self.starvation_limit = starvation_limit
+        self._lanes: dict[Priority, deque[str]] = {p: deque() for p in Priority}
+        # Messages of higher lanes sent while a lane was waiting.
+        self._skipped: dict[Priority, int] = dict.fromkeys(Priority, 0)
+        self._size = 0
+        self._not_empty = asyncio.Event()
+        self._reserved: str = None
+
+    def qsize(self) -> int:
+        """Return the number of waiting messages."""
+        return self._size
+
+    def empty(self) -> bool:
+        """Return whether no messages are waiting."""
+        return self._size == 0
+
+    def lane_size(self, priority: Priority) -> int:
+        """Return the number of waiting messages of a lane."""
+        return len(self._lanes[priority])
+
+    def put_nowait(self, msg: str, priority: Priority = Priority.NORMAL) -> None:
+        """Add a message to the end of its lane."""
+        self._lanes[priority].append(msg)
+        self._size += 1
+        self._not_empty.set()
+
+    async def put(self, msg: str, priority: Priority = Priority.NORMAL) -> None:
+        """Add a message to the end of its lane, the lanes are unbounded."""
+        self.put_nowait(msg, priority)
+
+    def _next_lane(self, waiting: list[Priority]) -> Priority:
+        # The lowest starving lane goes first.
+        for priority in reversed(waiting[1:]):
+            if self._skipped[priority] >= self.starvation_limit:
+                return priority
+        return waiting[0]
+
+    def peek(self) -> str:
+        """Return the next message without removing it, raise QueueEmpty if there is none."""
+        if not self._size:
+            raise asyncio.QueueEmpty
+        if self._reserved is not None:
+            return self._reserved
+        waiting = [p for p, lane in self._lanes.items() if lane]
+        return self._lanes[self._next_lane(waiting)][0]
+
+    def reserve(self) -> str:
+        """Fix the next message until it is removed and return it, raise QueueEmpty if there is none."""
+        if not self._size:
+            raise asyncio.QueueEmpty
+        if self._reserved is None:
+            self._reserved = self._pop_lane()
+        return self._reserved
+
+    def get_nowait(self) -> str:
+        """Remove and return the next message, raise QueueEmpty if there is none."""
+        if not self._size:
+            raise asyncio.QueueEmpty
+        if self._reserved is not None:
+            msg, self._reserved = self._reserved, None
+        else:
+            msg = self._pop_lane()
+
+        self._size -= 1
+        if not self._size:
+            self._not_empty.clear()
+        return msg
+
+    def _pop_lane(self) -> str:
+        waiting = [p for p, lane in self._lanes.items() if lane]
+        chosen = self._next_lane(waiting)
+        for priority in waiting:
+            if priority > chosen:
+                self._skipped[priority] += 1
+        self._skipped[chosen] = 0
+        return self._lanes[chosen].popleft()
+
+    async def wait(self) -> None:
+        """Wait until a message is waiting."""
+        while not self._size:
+            await self._not_empty.wait()
+
+    async def get(self) -> str:
+        """Remove and return the next message, wait until there is one."""
+        await self.wait()
+        return self.get_nowait()
+
+
+class TokenBucket:
+    """Allow rate messages per second on average and bursts of up to burst messages."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: int) -> None:
+        """Initialize a full bucket."""
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """Return the seconds until a message may be sent."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        """Use up the allowance for one message."""
+        self.tokens -= 1
+
+
+class RateLimiter:
+    """Limit the rate of messages sent to homee, so bursts don't overload the cube.
+
+    Allows rate messages per second (None for no overall limit) with bursts of
+    up to burst messages. protocol_limits maps a NodeProtocol to a (rate,
+    burst) budget that additionally applies to messages for nodes of that
+    protocol, i.e. to go easy on the Z-Wave radio. Messages are still sent in
+    queue order, so a message waiting for its protocol budget holds up the
+    messages behind it.
+
+    acquire() waits and uses up the allowance in one call. delay() and take()
+    do the same in steps, for callers that need to survive cancellation.
+    """
+
+    def __init__(
+        self,
+        rate: float | None = 10.0,
+        burst: int = 20,
+        protocol_limits: dict[int, tuple[float, int]] | None = None,
+    ) -> None:
+        """Initialize the limiter with full buckets.
+
+        Raises ValueError for a rate that is not positive or a burst below 1.
+        """
+        self.bucket = TokenBucket(rate, burst) if rate is not None else None
+        self.protocol_buckets = {
+            protocol: TokenBucket(protocol_rate, protocol_burst)
+            for protocol, (protocol_rate, protocol_burst) in (
+                protocol_limits or {}
+            ).items()
+        }
+        # Messages that had to wait and the total seconds they waited.
+        self.throttled = 0
+        self.wait_seconds = 0.0
+
+    def _buckets(self, protocol: int | None) -> list[TokenBucket]:
+        buckets = [self.bucket] if self.bucket is not None else []
+        protocol_bucket = self.protocol_buckets.get(protocol)
+        if protocol_bucket is not None:
+            buckets.append(protocol_bucket)
+        return buckets
+
+    def delay(self, protocol: int | None = None) -> float:
+        """Return the seconds until a message (for a node of protocol) may be sent."""
+        now = time.monotonic()
+        return max(
+            (bucket.delay(now) for bucket in self._buckets(protocol)), default=0.0
+        )
+
+    def take(self, protocol: int | None = None, waited: float = 0.0) -> None:
+        """Use up the allowance for a message that waited for waited seconds."""
+        for bucket in self._buckets(protocol):
+            bucket.take()
+        if waited:
+            self.throttled += 1
+            self.wait_seconds += waited
+
+    async def acquire(self, protocol: int | None = None) -> float:
+        """Wait until a message (for a node of protocol) may be sent, return the seconds waited."""
+        started = None
+        while (delay := self.delay(protocol)) > 0:
+            if started is None:
+                started = time.monotonic()
+            await asyncio.sleep(delay)
+
+        waited = time.monotonic() - started if started is not None else 0.0
+        self.take(protocol, waited)
+        return waited
+
+
+class Outbox:
+    """Messages sent while disconnected, to be sent once reconnected.
+
+    Every message expires ttl seconds after it was added, unless a ttl is
+    given for the message itself. A message with a key (i.e. the node and
+    attribute of a set_value() call) replaces the waiting message with the
+    same key, so only the latest command for a target survives. If more than
+    max_size messages are waiting, the oldest one is discarded.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_size: int = 1000) -> None:
+        """Initialize an empty outbox."""
+        self.ttl = ttl
+        self.max_size = max_size
+        self.expired = 0
+        self.coalesced = 0
+        self.overflowed = 0
+        # In the order of the latest add().
+        self._messages: dict[Hashable, tuple[str, float, Priority]] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        """Return the number of waiting messages, including expired ones."""
+        return len(self._messages)
+
+    def add(
+        self,
+        msg: str,
+        key: Hashable | None = None,
+        ttl: float | None = None,
+        priority: Priority = Priority.NORMAL,
+    ) -> None:
+        """Add a message, replacing a waiting message with the same key."""
+        if key is None:
+            # Unique, so messages without a key are never coalesced.
+            key = (Outbox, self._next_id)
+            self._next_id += 1
+        elif self._messages.pop(key, None) is not None:
+            self.coalesced += 1
+
+        if len(self._messages) >= self.max_size:
+            del self._messages[next(iter(self._messages))]
+            self.overflowed += 1
+
+        expires = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        self._messages[key] = (msg, expires, priority)
+
+    def discard(self, key: Hashable) -> None:
+        """Remove the waiting message with key, i.e. because a newer one was sent."""
+        self._messages.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all waiting messages."""
+        self._messages.clear()
+
+    def drain(self) -> list[tuple[str, Priority]]:
+        """Remove all waiting messages and return (message, priority) of those that did not expire, oldest first."""
+        now = time.monotonic()
+        messages = [
+            (msg, priority)
+            for msg, expires, priority in self._messages.values()
+            if expires > now
+        ]
+        expired = len(self._messages) - len(messages)
+        self._messages.clear()
+        if expired:
+            self.expired += expired
+            _LOGGER.info("Discarded %s expired messages", expired)
+        return messages
@@ -0,0 +1,202 @@
+"""Timing of message handling stages and callbacks, and profiling windows."""
+
+import asyncio
+from collections import Counter
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+
+_LOGGER = logging.getLogger(__name__)
+
+# Stages of handling a message.
+STAGE_MODEL = "model"
+STAGE_LISTENER = "listener"
+STAGE_ON_ATTRIBUTE_UPDATED = "on_attribute_updated"
+STAGE_ON_MESSAGE = "on_message"
+
+
+def callback_name(callback) -> str:
+    """Return a readable name of a callback."""
+    if isinstance(callback, str):
+        return callback
+    # OffloadedListener and similar wrappers.
+    callback = getattr(callback, "listener", callback)
+    name = getattr(callback, "__qualname__", None) or type(callback).__qualname__
+    module = getattr(callback, "__module__", None)
+    return f"{module}.{name}" if module else name
+
+
+class CallbackStats:
+    """Accumulated timings of one callback in one stage."""
+
+    __slots__ = ("stage", "name", "calls", "total", "max")
+
+    def __init__(self, stage: str, name: str) -> None:
+        """Initialize empty stats."""
+        self.stage = stage
+        self.name = name
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @property
+    def mean(self) -> float:
+        """Average seconds per call."""
+        return self.total / self.calls if self.calls else 0.0
+
+    def __repr__(self) -> str:
+        """Return a readable representation."""
+        return (
+            f"<CallbackStats {self.stage} {self.name} calls={self.calls} "
+            f"total={self.total:.6f} max={self.max:.6f}>"
+        )
+
+
+class CallbackProfiler:
+    """Time the stages of message handling per callback.
+
+    Stages are the model update (per message type), node listeners,
+    on_attribute_updated() and on_message(). Calls that take longer than
+    slow_threshold seconds are logged with the name of the callback and node.
+    """
+
+    def __init__(self, slow_threshold: float | None = 0.05) -> None:
+        """Initialize the profiler. Use slow_threshold=None to never log."""
+        self.slow_threshold = slow_threshold
+        self.slow_calls = 0
+        # Seconds spent in recorded callbacks, used to tell model time apart.
+        self.nested = 0.0
+        self._stats: dict[tuple[str, str], CallbackStats] = {}
+
+    def record(self, stage: str, callback, duration: float, node=None) -> None:
+        """Record a single call of callback in stage."""
+        name = callback_name(callback)
+        stats = self._stats.get((stage, name))
+        if stats is None:
+            stats = self._stats[(stage, name)] = CallbackStats(stage, name)
+        stats.calls += 1
+        stats.total += duration
+        if duration > stats.max:
+            stats.max = duration
+        if stage != STAGE_MODEL:
+            self.nested += duration
+
+        if self.slow_threshold is not None and duration > self.slow_threshold:
+            self.slow_calls += 1
+            _LOGGER.warning(
+                "Slow %s %s took %.1f ms%s",
+                stage,
+                name,
+                duration * 1000,
+                f" (node {node.id} {node.name})" if node is not None else "",
+            )
+
+    def top(self, n: int = 10, key: str = "total") -> list[CallbackStats]:
+        """Return the n most expensive callbacks by total, max or mean time."""
+        return sorted(
+            self._stats.values(), key=lambda s: getattr(s, key), reverse=True
+        )[:n]
+
+    def dump(self, n: int = 10, key: str = "total") -> str:
+        """Return a table of the n most expensive callbacks."""
+        lines = [
+            f"{'stage':<22} {'calls':>8} {'total ms':>10} {'mean ms':>9} "
+            f"{'max ms':>9}  callback"
+        ]
+        for s in self.top(n, key):
+            lines.append(
+                f"{s.stage:<22} {s.calls:>8} {s.total * 1000:>10.2f} "
+                f"{s.mean * 1000:>9.3f} {s.max * 1000:>9.3f}  {s.name}"
+            )
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        """Forget all recorded timings."""
+        self._stats.clear()
+        self.slow_calls = 0
+        self.nested = 0.0
+
+
+class SamplingProfiler:
+    """Sample the stack of a thread at a fixed interval.
+
+    Cheaper than cProfile for long windows and shows where the event loop
+    actually spends its time, including code that is not a callback.
+    """
+
+    def __init__(self, interval: float = 0.001, depth: int = 20) -> None:
+        """Initialize the profiler with the sampling interval in seconds."""
+        self.interval = interval
+        self.depth = depth
+        self.samples: Counter = Counter()
+        self._thread: threading.Thread = None
+        self._stop = threading.Event()
+
+    def start(self, thread_id: int | None = None) -> None:
+        """Start sampling the given thread (default: the calling thread)."""
+        target = thread_id if thread_id is not None else threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._sample, args=(target,), name="pymee-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _sample(self, thread_id: int) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None and len(stack) < self.depth:
+                code = frame.f_code
+                stack.append(f"{code.co_filename}:{frame.f_lineno}({code.co_name})")
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(stack)] += 1
+
+    def report(self, limit: int = 20) -> str:
+        """Return the innermost frames that were seen most often."""
+        total = sum(self.samples.values())
+        functions: Counter = Counter()
+        for stack, count in self.samples.items():
+            functions[stack[0]] += count
+
+        lines = [f"{total} samples"]
+        for function, count in functions.most_common(limit):
+            lines.append(f"{count / total * 100:6.2f}%  {function}")
+        return "\n".join(lines)
+
+
+async def profile_window(
+    duration: float, sampling: bool = False, limit: int = 30, sort: str = "cumulative"
+) -> str:
+    """Profile the running event loop for duration seconds and return a report.
+
+    Uses cProfile by default, or a SamplingProfiler with sampling=True.
+    """
+    if sampling:
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            profiler.stop()
+        return profiler.report(limit)
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        await asyncio.sleep(duration)
+    finally:
+        profile.disable()
+    out = io.StringIO()
+    pstats.Stats(profile, stream=out).sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,77 @@
+"""Reconnect backoff and process wide connection limits."""
+
+import asyncio
+import random
+import weakref
+
+
+class ReconnectPolicy:
+    """Exponential backoff with full jitter between reconnect attempts.
+
+    The delay before retry n is a random value between 0 and
+    min(max_delay, initial_delay * multiplier ** (n - 1)). Jitter keeps many
+    instances from reconnecting in lockstep after an outage.
+    """
+
+    def __init__(
+        self,
+        initial_delay: float = 5.0,
+        max_delay: float = 300.0,
+        multiplier: float = 2.0,
+        max_retries: int | None = 5,
+        jitter: bool = True,
+    ) -> None:
+        """Initialize the policy. Use max_retries=None to retry forever."""
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.max_retries = max_retries
+        self.jitter = jitter
+
+    def should_retry(self, retries: int) -> bool:
+        """Return whether another attempt should be made after the given number of retries."""
+        return self.max_retries is None or retries < self.max_retries
+
+    def delay(self, retry: int) -> float:
+        """Return the number of seconds to wait before the given retry (starting at 1)."""
+        if retry <= 0:
+            return 0.0
+
+        # Cap the exponent, the delay is capped by max_delay long before that anyway.
+        exponent = min(retry - 1, 64)
+        delay = min(self.max_delay, self.initial_delay * self.multiplier**exponent)
+        return random.uniform(0, delay) if self.jitter else delay
+
+
+class ConnectLimiter:
+    """Limit how many connects and authentications run at once in this process."""
+
+    def __init__(self, limit: int = 10) -> None:
+        """Initialize the limiter."""
+        self._limit = limit
+        # One semaphore per event loop, semaphores can't be shared between loops.
+        self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    @property
+    def limit(self) -> int:
+        """Maximum number of concurrent connection attempts."""
+        return self._limit
+
+    @limit.setter
+    def limit(self, limit: int) -> None:
+        """Change the limit. Only affects attempts started afterwards."""
+        self._limit = limit
+        self._semaphores.clear()
+
+    def slot(self) -> asyncio.Semaphore:
+        """Return the semaphore for the running loop, use it with `async with`."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self._limit)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+
+# Shared by all Homee instances of the process.
+connect_limiter = ConnectLimiter()
@@ -0,0 +1,215 @@
+"""Record and replay the raw websocket traffic of a Homee instance.
+
+A recording is a header followed by one record per frame. Each record holds
+the seconds since the recording started, the direction and the raw frame.
+Files ending in .gz are compressed.
+
+Run `python -m pymee.recording <file>` to replay a recording into a Homee
+instance as fast as possible and print the throughput.
+"""
+
+import argparse
+import asyncio
+from collections.abc import Iterable, Iterator
+import gzip
+import logging
+import struct
+import time
+from typing import BinaryIO, NamedTuple
+
+from . import Homee
+
+_LOGGER = logging.getLogger(__name__)
+
+_MAGIC = b"PYMEEREC"
+_VERSION = 1
+# Magic, version, wall clock time the recording started.
+_HEADER = struct.Struct("<8sBd")
+# Seconds since start, direction, length of the frame.
+_RECORD = struct.Struct("<dBI")
+
+# Frame directions.
+INCOMING = 0
+OUTGOING = 1
+
+
+class Frame(NamedTuple):
+    """A single recorded websocket frame."""
+
+    time: float
+    direction: int
+    data: str
+
+
+def _open(path: str, mode: str) -> BinaryIO:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+class TrafficRecorder:
+    """Record the websocket frames received and sent by a Homee instance.
+
+    Incoming frames are taken from _ws_on_message() and outgoing frames from
+    _ws_send(), so replies of the cube and requests of the library end up in
+    the same timeline. Outgoing frames are recorded when they are written to
+    the websocket, in the order they went out.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize the recorder. The file is created on attach()."""
+        self.path = path
+        self.frames = 0
+        self.started = 0.0
+        self._file: BinaryIO = None
+        self._homee: Homee = None
+
+    def attach(self, homee: Homee) -> None:
+        """Start recording the traffic of homee."""
+        if self._homee is not None:
+            raise RuntimeError("The recorder is already attached")
+
+        self._file = _open(self.path, "wb")
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION, time.time()))
+        self.started = time.perf_counter()
+        self._homee = homee
+
+        on_message = homee._ws_on_message
+        ws_send = homee._ws_send
+
+        async def _ws_on_message(msg: str):
+            self.write(INCOMING, msg)
+            await on_message(msg)
+
+        async def _ws_send(ws, msg: str):
+            await ws_send(ws, msg)
+            self.write(OUTGOING, msg)
+
+        # Shadow the bound methods on the instance, detach() removes them again.
+        homee._ws_on_message = _ws_on_message
+        homee._ws_send = _ws_send
+
+    def detach(self) -> None:
+        """Stop recording and close the file."""
+        if self._homee is None:
+            return
+
+        del self._homee._ws_on_message
+        del self._homee._ws_send
+        self._homee = None
+        self._file.close()
+        self._file = None
+
+    def write(self, direction: int, msg: str | bytes) -> None:
+        """Append a frame to the recording."""
+        if isinstance(msg, str):
+            msg = msg.encode("utf-8")
+        self._file.write(
+            _RECORD.pack(time.perf_counter() - self.started, direction, len(msg))
+        )
+        self._file.write(msg)
+        self.frames += 1
+
+    def __enter__(self):
+        """Return the recorder, it is detached when leaving the context."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Detach the recorder."""
+        self.detach()
+
+
+def read_recording(path: str) -> Iterator[Frame]:
+    """Yield the frames of a recording."""
+    with _open(path, "rb") as f:
+        magic, version, _ = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a pymee recording")
+
+        while True:
+            record = f.read(_RECORD.size)
+            if len(record) < _RECORD.size:
+                return
+            offset, direction, length = _RECORD.unpack(record)
+            yield Frame(offset, direction, f.read(length).decode("utf-8"))
+
+
+def recording_started(path: str) -> float:
+    """Return the wall clock time (unix timestamp) the recording started."""
+    with _open(path, "rb") as f:
+        return _HEADER.unpack(f.read(_HEADER.size))[2]
+
+
+class TrafficReplayer:
+    """Feed a recording into a Homee instance without a network connection.
+
+    Incoming frames are passed to _ws_on_message() with their original timing
+    divided by speed. With speed=None they are replayed as fast as possible.
+    Outgoing frames are skipped.
+    """
+
+    def __init__(self, frames: str | Iterable[Frame], speed: float | None = 1.0):
+        """Initialize the replayer with the path of a recording or a list of frames."""
+        self.frames = frames
+        self.speed = speed
+        # Statistics of the last replay.
+        self.replayed = 0
+        self.duration = 0.0
+        self.max_delay = 0.0
+
+    async def replay(self, homee: Homee) -> None:
+        """Replay all incoming frames into homee."""
+        frames = (
+            read_recording(self.frames) if isinstance(self.frames, str) else self.frames
+        )
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        first: float = None
+        self.replayed = 0
+        self.max_delay = 0.0
+
+        for frame in frames:
+            if frame.direction != INCOMING:
+                continue
+
+            if self.speed:
+                if first is None:
+                    first = frame.time
+                due = started + (frame.time - first) / self.speed
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    # How far the replay fell behind the requested speed.
+                    self.max_delay = max(self.max_delay, -delay)
+
+            await homee._ws_on_message(frame.data)
+            self.replayed += 1
+
+        self.duration = loop.time() - started
+
+    @property
+    def rate(self) -> float:
+        """Frames per second of the last replay."""
+        return self.replayed / self.duration if self.duration else 0.0
+
+
+async def _main(args: argparse.Namespace) -> None:
+    homee = Homee("127.0.0.1", "replay", "replay")
+    replayer = TrafficReplayer(args.path, args.speed or None)
+    await replayer.replay(homee)
+    print(
+        f"Replayed {replayer.replayed} frames in {replayer.duration:.3f}s "
+        f"({replayer.rate:.1f} frames/s, max delay {replayer.max_delay:.3f}s), "
+        f"{len(homee.nodes)} nodes"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a websocket recording.")
+    parser.add_argument("path")
+    parser.add_argument(
+        "--speed", type=float, default=0, help="speed factor, 0 for maximum speed"
+    )
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,478 @@
+"""Spread many Homee connections across worker processes."""
+
+import asyncio
+import bisect
+from collections.abc import Hashable
+import hashlib
+import logging
+import marshal
+import multiprocessing
+from multiprocessing.connection import Connection
+import os
+import queue
+import threading
+import time
+
+from . import Homee
+from .events import EventStream, HomeeEvent, OverflowPolicy
+from .manager import HomeeManager
+
+_LOGGER = logging.getLogger(__name__)
+
+# Worker -> parent frames.
+_EVENT = 0
+_HEALTH = 1
+# Parent -> worker frames.
+_ADD = 0
+_REMOVE = 1
+_STOP = 2
+# Put into the parent inbox when the connection to a worker broke.
+_LOST = -1
+
+
+def _encode(*fields) -> bytes:
+    """Encode a frame for the IPC channel.
+
+    marshal is compact, fast and handles everything json can, and both ends
+    always run the same interpreter.
+    """
+    return marshal.dumps(fields)
+
+
+def _decode(data: bytes) -> tuple:
+    """Decode a frame from the IPC channel."""
+    return marshal.loads(data)
+
+
+class HashRing:
+    """Consistent hash ring mapping keys to shards.
+
+    Adding or removing a shard only moves the keys of that shard.
+    """
+
+    def __init__(self, replicas: int = 64) -> None:
+        """Initialize an empty ring with the given number of points per shard."""
+        self.replicas = replicas
+        self._points: list[int] = []
+        self._owners: dict[int, Hashable] = {}
+        self._shards: set[Hashable] = set()
+
+    def __len__(self) -> int:
+        """Return the number of shards."""
+        return len(self._shards)
+
+    def __contains__(self, shard: Hashable) -> bool:
+        """Return whether the shard is part of the ring."""
+        return shard in self._shards
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(
+            hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big"
+        )
+
+    def add(self, shard: Hashable) -> None:
+        """Add a shard to the ring."""
+        if shard in self._shards:
+            return
+
+        self._shards.add(shard)
+        for i in range(self.replicas):
+            point = self._hash(f"{shard}#{i}")
+            bisect.insort(self._points, point)
+            self._owners[point] = shard
+
+    def remove(self, shard: Hashable) -> None:
+        """Remove a shard from the ring."""
+        if shard not in self._shards:
+            return
+
+        self._shards.discard(shard)
+        for i in range(self.replicas):
+            point = self._hash(f"{shard}#{i}")
+            index = bisect.bisect_left(self._points, point)
+            del self._points[index]
+            del self._owners[point]
+
+    def get(self, key: str) -> Hashable:
+        """Return the shard responsible for the key."""
+        if not self._points:
+            raise LookupError("The hash ring has no shards")
+
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[self._points[index]]
+
+
+class _FrameWriter:
+    """Write frames to the parent process in a thread.
+
+    Pipe writes block while the parent is slow to read, which must not stall
+    the websockets of the worker. Frames that don't fit into the buffer are
+    dropped.
+    """
+
+    def __init__(self, connection: Connection, maxsize: int) -> None:
+        self.connection = connection
+        self.dropped = 0
+        self._queue: queue.Queue[bytes | None] = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def send(self, *fields) -> None:
+        """Queue a frame without blocking."""
+        try:
+            self._queue.put_nowait(_encode(*fields))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float | None = None) -> None:
+        """Write the queued frames and close the connection."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self.connection.close()
+
+    def _run(self) -> None:
+        broken = False
+        while True:
+            data = self._queue.get()
+            if data is None:
+                return
+            if broken:
+                # Keep draining, so close() does not wait for a full queue.
+                continue
+            try:
+                self.connection.send_bytes(data)
+            except OSError:
+                broken = True
+
+
+async def _forward_events(key: str, stream: EventStream, events: _FrameWriter):
+    """Send all events of one cube to the parent process."""
+    async for event in stream:
+        events.send(_EVENT, key, event.type, event.data)
+
+
+async def _report_health(
+    index: int, manager: HomeeManager, events: _FrameWriter, interval: float
+):
+    """Periodically send the health of this worker to the parent process."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        health = manager.stats()
+        health["pid"] = os.getpid()
+        # How late the sleep woke up, a rough measure of how busy the worker is.
+        health["lag"] = loop.time() - started - interval
+        health["dropped"] = events.dropped
+        events.send(_HEALTH, index, health)
+
+
+async def _worker_main(
+    index: int,
+    commands: Connection,
+    events: Connection,
+    homee_class: type[Homee],
+    homee_kwargs: dict,
+    health_interval: float,
+    buffer_size: int,
+):
+    loop = asyncio.get_running_loop()
+    inbox = asyncio.Queue()
+    writer = _FrameWriter(events, buffer_size)
+
+    def read_commands():
+        while True:
+            try:
+                command = _decode(commands.recv_bytes())
+            except (EOFError, OSError):
+                command = (_STOP,)
+            loop.call_soon_threadsafe(inbox.put_nowait, command)
+            if command[0] == _STOP:
+                return
+
+    threading.Thread(target=read_commands, daemon=True).start()
+
+    manager = HomeeManager(homee_class, **homee_kwargs)
+    await manager.start()
+    forwarders: dict[str, asyncio.Task] = {}
+    health = asyncio.create_task(
+        _report_health(index, manager, writer, health_interval)
+    )
+
+    while True:
+        command = await inbox.get()
+        if command[0] == _ADD:
+            key, host, user, password, kwargs = command[1:]
+            if key in manager:
+                continue
+            homee = manager.add(key, host, user, password, **kwargs)
+            stream = homee.events(
+                maxsize=buffer_size, overflow=OverflowPolicy.DROP_OLDEST
+            )
+            forwarders[key] = asyncio.create_task(_forward_events(key, stream, writer))
+        elif command[0] == _REMOVE:
+            key = command[1]
+            task = forwarders.pop(key, None)
+            if task is not None:
+                task.cancel()
+            if key in manager:
+                await manager.remove(key)
+        elif command[0] == _STOP:
+            break
+
+    health.cancel()
+    for task in forwarders.values():
+        task.cancel()
+    await manager.stop()
+    await loop.run_in_executor(None, writer.close, 5.0)
+
+
+def _run_worker(*args):
+    """Entry point of a worker process."""
+    asyncio.run(_worker_main(*args))
+
+
+class _Worker:
+    """Parent side bookkeeping of a worker process."""
+
+    def __init__(self, index, process, commands, events) -> None:
+        self.index = index
+        self.process: multiprocessing.Process = process
+        self.commands: Connection = commands
+        self.events: Connection = events
+        # Reads events until the worker's end of the pipe is closed.
+        self.reader: threading.Thread = None
+        self.health: dict = {}
+        self.last_seen = time.monotonic()
+
+    def send(self, *fields) -> bool:
+        try:
+            self.commands.send_bytes(_encode(*fields))
+        except (BrokenPipeError, OSError):
+            return False
+        return True
+
+
+class ShardedRunner:
+    """Run Homee connections in several worker processes.
+
+    Cubes are assigned to workers by consistent hashing of their key. Workers
+    send the decoded messages of their cubes back over a binary pipe, where
+    they are passed to on_event(). If a worker dies or stops reporting its
+    health, its cubes are moved to the remaining workers.
+
+    Workers are started with the 'spawn' method, so homee_class and all
+    keyword arguments need to be picklable and the calling script needs an
+    `if __name__ == "__main__":` guard.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        homee_class: type[Homee] = Homee,
+        health_interval: float = 5.0,
+        health_timeout: float | None = None,
+        buffer_size: int = 10000,
+        replicas: int = 64,
+        **homee_kwargs,
+    ) -> None:
+        """Initialize the runner.
+
+        homee_kwargs are used as defaults for every cube. A worker that did not
+        report its health for health_timeout seconds (default: three health
+        intervals) is considered dead.
+        """
+        self.worker_count = workers or os.cpu_count() or 1
+        self.homee_class = homee_class
+        self.homee_kwargs = homee_kwargs
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout or 3 * health_interval
+        self.buffer_size = buffer_size
+
+        self._ring = HashRing(replicas)
+        self._cubes: dict[str, tuple] = {}
+        self._assignments: dict[str, int] = {}
+        self._workers: dict[int, _Worker] = {}
+        self._inbox: asyncio.Queue = None
+        self._tasks: list[asyncio.Task] = []
+        self._context = multiprocessing.get_context("spawn")
+
+    @property
+    def health(self) -> dict[int, dict]:
+        """Return the last health report of every live worker."""
+        return {index: worker.health for index, worker in self._workers.items()}
+
+    def shard_of(self, key: str) -> int | None:
+        """Return the index of the worker running the cube with the given key."""
+        return self._assignments.get(key)
+
+    def add(self, key: str, host: str, user: str, password: str, **kwargs) -> None:
+        """Add a cube. It is started right away if the runner is running."""
+        if key in self._cubes:
+            raise ValueError(f"A cube with key {key} already exists")
+
+        self._cubes[key] = (host, user, password, kwargs)
+        if self._workers:
+            self._assign(key)
+
+    def remove(self, key: str) -> None:
+        """Stop and remove a cube."""
+        del self._cubes[key]
+        index = self._assignments.pop(key, None)
+        if index is not None and index in self._workers:
+            self._workers[index].send(_REMOVE, key)
+
+    async def start(self) -> None:
+        """Start the worker processes and distribute the cubes."""
+        self._inbox = asyncio.Queue()
+        for index in range(self.worker_count):
+            self._spawn(index)
+        for key in self._cubes:
+            self._assign(key)
+
+        self._tasks = [
+            asyncio.create_task(self._dispatch()),
+            asyncio.create_task(self._supervise()),
+        ]
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Stop all workers."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        for worker in self._workers.values():
+            worker.send(_STOP)
+
+        loop = asyncio.get_running_loop()
+        for worker in self._workers.values():
+            await loop.run_in_executor(None, worker.process.join, timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.commands.close()
+            # The reader closes the events pipe once it sees the end of it.
+            await loop.run_in_executor(None, worker.reader.join, timeout)
+            self._ring.remove(worker.index)
+        self._workers.clear()
+        self._assignments.clear()
+
+    def _spawn(self, index: int) -> None:
+        command_reader, command_writer = self._context.Pipe(duplex=False)
+        event_reader, event_writer = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_run_worker,
+            args=(
+                index,
+                command_reader,
+                event_writer,
+                self.homee_class,
+                self.homee_kwargs,
+                self.health_interval,
+                self.buffer_size,
+            ),
+            name=f"pymee-shard-{index}",
+            daemon=True,
+        )
+        process.start()
+        # The child owns these ends now.
+        command_reader.close()
+        event_writer.close()
+
+        worker = _Worker(index, process, command_writer, event_reader)
+        self._workers[index] = worker
+        self._ring.add(index)
+
+        loop = asyncio.get_running_loop()
+        worker.reader = threading.Thread(
+            target=self._read_events, args=(loop, worker), daemon=True
+        )
+        worker.reader.start()
+
+    def _read_events(self, loop: asyncio.AbstractEventLoop, worker: _Worker) -> None:
+        """Read frames of one worker in a thread and pass them to the loop."""
+        while True:
+            try:
+                frame = _decode(worker.events.recv_bytes())
+            except (EOFError, OSError):
+                worker.events.close()
+                loop.call_soon_threadsafe(self._inbox.put_nowait, (_LOST, worker.index))
+                return
+            loop.call_soon_threadsafe(self._inbox.put_nowait, frame)
+
+    def _assign(self, key: str) -> None:
+        index = self._ring.get(key)
+        host, user, password, kwargs = self._cubes[key]
+        self._assignments[key] = index
+        self._workers[index].send(_ADD, key, host, user, password, kwargs)
+
+    async def _dispatch(self) -> None:
+        while True:
+            frame = await self._inbox.get()
+            try:
+                if frame[0] == _EVENT:
+                    _, key, msg_type, data = frame
+                    await self.on_event(
+                        key, HomeeEvent.from_message(msg_type, {msg_type: data})
+                    )
+                elif frame[0] == _HEALTH:
+                    _, index, health = frame
+                    worker = self._workers.get(index)
+                    if worker is not None:
+                        worker.health = health
+                        worker.last_seen = time.monotonic()
+                        await self.on_worker_health(index, health)
+                elif frame[0] == _LOST and frame[1] in self._workers:
+                    await self._rebalance(frame[1])
+            except Exception:
+                _LOGGER.exception("Error while handling frame from worker")
+
+    async def _supervise(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            now = time.monotonic()
+            for index, worker in list(self._workers.items()):
+                if (
+                    not worker.process.is_alive()
+                    or now - worker.last_seen > self.health_timeout
+                ):
+                    await self._rebalance(index)
+
+    async def _rebalance(self, index: int) -> None:
+        """Remove a dead worker and move its cubes to the remaining ones."""
+        # _supervise() and _dispatch() may both notice the same dead worker.
+        worker = self._workers.pop(index, None)
+        if worker is None:
+            return
+        self._ring.remove(index)
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.commands.close()
+
+        keys = [key for key, shard in self._assignments.items() if shard == index]
+        _LOGGER.warning(
+            "Worker %s (pid %s) died, moving %s cubes",
+            index,
+            worker.process.pid,
+            len(keys),
+        )
+        await self.on_worker_died(index, keys)
+
+        if not self._workers:
+            _LOGGER.error("No workers left to run %s cubes", len(keys))
+            for key in keys:
+                del self._assignments[key]
+            return
+
+        for key in keys:
+            self._assign(key)
+
+    async def on_event(self, key: str, event: HomeeEvent):
+        """Execute for every message received by one of the cubes."""
+
+    async def on_worker_health(self, index: int, health: dict):
+        """Execute when a worker reported its health."""
+
+    async def on_worker_died(self, index: int, keys: list[str]):
+        """Execute when a worker died, before its cubes are moved."""
@@ -0,0 +1,215 @@
+"""Incremental parsing of the 'all' message."""
+
+import json
+import re
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_START = re.compile(r'[ \t\n\r]*\{[ \t\n\r]*"all"[ \t\n\r]*:[ \t\n\r]*\{')
+# Long enough for the start of an 'all' message with some whitespace.
+_START_LENGTH = 32
+
+_STATE_START = 0
+_STATE_KEY = 1
+_STATE_NODES = 2
+_STATE_END = 3
+_STATE_DONE = 4
+
+
+def is_all_message(msg: str) -> bool:
+    """Return whether a raw message is an 'all' message."""
+    return _START.match(msg[:_START_LENGTH]) is not None
+
+
+class AllMessageParser:
+    """Parse an 'all' message piece by piece.
+
+    Iterating yields ('settings', {...}), ('groups', [...]) and so on for
+    every entry of the message, except for nodes, which are yielded one at a
+    time as ('node', {...}). So nodes can be handled while the rest of the
+    message has not been decoded yet. The decoded entries are collected in
+    data, which looks like the content of the message once parsing is done.
+    Only the parsed text is released as parsing goes on, data keeps every
+    decoded node.
+
+    Text can be passed in chunks with feed(). Iteration stops when more text
+    is needed, call close() after the last chunk.
+    """
+
+    def __init__(self, msg: str = "") -> None:
+        """Initialize the parser, optionally with the complete message."""
+        self.data: dict = {}
+        self._buffer = msg
+        self._pos = 0
+        self._closed = bool(msg)
+        self._state = _STATE_START
+        self._first = True
+        self._decoder = json.JSONDecoder()
+        # Keys shared by all nodes, see _share_keys().
+        self._keys: dict[str, str] = {}
+
+    @property
+    def done(self) -> bool:
+        """Whether the whole message has been parsed."""
+        return self._state == _STATE_DONE
+
+    def feed(self, chunk: str) -> None:
+        """Add the next chunk of the message."""
+        if self._closed:
+            raise ValueError("The parser has been closed")
+        # Drop the parsed text so the buffer stays bounded by the largest entry.
+        self._buffer = self._buffer[self._pos :] + chunk
+        self._pos = 0
+
+    def close(self) -> None:
+        """Mark the end of the message."""
+        self._closed = True
+
+    def __iter__(self):
+        """Return the parser, it is its own iterator."""
+        return self
+
+    def __next__(self) -> tuple[str, object]:
+        """Return the next (key, value) pair."""
+        while self._state != _STATE_DONE:
+            item = self._step()
+            if item is _MORE:
+                if self._closed:
+                    raise ValueError("Incomplete 'all' message")
+                raise StopIteration
+            if item is not None:
+                return item
+        if self._pos != len(self._buffer.rstrip()):
+            raise ValueError("Unexpected data after the 'all' message")
+        raise StopIteration
+
+    def _skip(self, pos: int) -> int:
+        return _WHITESPACE.match(self._buffer, pos).end()
+
+    def _decode(self, pos: int, separators: str):
+        """Decode a value at pos, return (value, end) or _MORE.
+
+        Until close(), a value only counts as complete once one of separators
+        follows it, a number at the end of the buffer may continue in the
+        next chunk.
+        """
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, pos)
+        except json.JSONDecodeError:
+            if self._closed:
+                raise
+            return _MORE
+        if not self._closed:
+            following = self._skip(end)
+            if (
+                following >= len(self._buffer)
+                or self._buffer[following] not in separators
+            ):
+                return _MORE
+        return value, end
+
+    def _step(self):
+        """Advance by one step, return an item, None or _MORE."""
+        buffer = self._buffer
+
+        if self._state == _STATE_START:
+            match = _START.match(buffer, self._pos)
+            if match is None:
+                if len(buffer) - self._pos < _START_LENGTH and not self._closed:
+                    return _MORE
+                raise ValueError("Not an 'all' message")
+            self._pos = match.end()
+            self._state = _STATE_KEY
+            return None
+
+        if self._state == _STATE_KEY:
+            pos = self._skip(self._pos)
+            if pos >= len(buffer):
+                return _MORE
+            if buffer[pos] == "}":
+                self._pos = pos + 1
+                self._state = _STATE_END
+                return None
+            if not self._first:
+                if buffer[pos] != ",":
+                    raise ValueError(f"Expected ',' at {pos}")
+                pos = self._skip(pos + 1)
+            decoded = self._decode(pos, ":")
+            if decoded is _MORE:
+                return _MORE
+            key, pos = decoded
+            pos = self._skip(pos)
+            if pos >= len(buffer):
+                return _MORE
+            if buffer[pos] != ":":
+                raise ValueError(f"Expected ':' at {pos}")
+            pos = self._skip(pos + 1)
+            if key == "nodes":
+                if pos >= len(buffer):
+                    return _MORE
+                if buffer[pos] == "[":
+                    self._pos = pos + 1
+                    self._first = True
+                    self.data["nodes"] = []
+                    self._state = _STATE_NODES
+                    return None
+            # Nothing is committed before the value is complete, the key is
+            # decoded again with the next chunk.
+            decoded = self._decode(pos, ",}")
+            if decoded is _MORE:
+                return _MORE
+            value, self._pos = decoded
+            self.data[key] = value
+            self._first = False
+            return key, value
+
+        if self._state == _STATE_NODES:
+            pos = self._skip(self._pos)
+            if pos >= len(buffer):
+                return _MORE
+            if buffer[pos] == "]":
+                self._pos = pos + 1
+                self._first = False
+                self._state = _STATE_KEY
+                return None
+            if not self._first:
+                if buffer[pos] != ",":
+                    raise ValueError(f"Expected ',' at {pos}")
+                pos = self._skip(pos + 1)
+            decoded = self._decode(pos, ",]")
+            if decoded is _MORE:
+                return _MORE
+            node, self._pos = decoded
+            node = _share_keys(node, self._keys)
+            self._first = False
+            self.data["nodes"].append(node)
+            return "node", node
+
+        # _STATE_END
+        pos = self._skip(self._pos)
+        if pos >= len(buffer):
+            return _MORE
+        if buffer[pos] != "}":
+            raise ValueError(f"Expected '}}' at {pos}")
+        self._pos = pos + 1
+        self._state = _STATE_DONE
+        return None
+
+
+def _share_keys(value, keys: dict[str, str]):
+    """Return value with the dict keys replaced by the equal ones in keys.
+
+    json.loads() uses the same string for equal keys within one document, but
+    raw_decode() only within one call. Without sharing, every node would keep
+    its own copy of every key.
+    """
+    if isinstance(value, dict):
+        return {
+            keys.setdefault(key, key): _share_keys(item, keys)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_share_keys(item, keys) for item in value]
+    return value
+
+
+_MORE = object()
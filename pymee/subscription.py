@@ -0,0 +1,128 @@
+"""Rate controlled attribute subscriptions built on top of node listeners."""
+
+from collections.abc import Callable
+from enum import IntEnum, unique
+import logging
+
+from .model import HomeeAttribute, HomeeNode
+from .timer import TimerWheel, WheelTimer
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@unique
+class SubscriptionMode(IntEnum):
+    """How often a subscription forwards attribute updates to its listener."""
+
+    # Forward every update (same as a plain node listener).
+    IMMEDIATE = 0
+    # Forward the latest update once no update arrived for `interval` seconds.
+    DEBOUNCE = 1
+    # Forward an update right away, then ignore updates for `interval` seconds.
+    THROTTLE = 2
+    # Forward the latest update at most once every `interval` seconds.
+    SAMPLE = 3
+
+
+class AttributeSubscription:
+    """Forward attribute updates of a node to a listener at a controlled rate.
+
+    The listener is called with (node, attribute) just like a node listener.
+    Subscriptions can be limited to a single attribute id and/or attribute type.
+    """
+
+    def __init__(
+        self,
+        node: HomeeNode,
+        listener: Callable,
+        wheel: TimerWheel,
+        mode: SubscriptionMode = SubscriptionMode.IMMEDIATE,
+        interval: float = 0,
+        attribute_id: int | None = None,
+        attribute_type: int | None = None,
+    ) -> None:
+        """Initialize the subscription and register it with the node."""
+        mode = SubscriptionMode(mode)
+        if mode != SubscriptionMode.IMMEDIATE and interval <= 0:
+            raise ValueError(f"{mode.name} subscriptions need a positive interval")
+
+        self.node = node
+        self.listener = listener
+        self.mode = mode
+        self.interval = interval
+        self.attribute_id = attribute_id
+        self.attribute_type = attribute_type
+
+        self._wheel = wheel
+        self._timer: WheelTimer = None
+        # Latest pending update per attribute id (debounce and sample modes).
+        self._pending: dict[int, HomeeAttribute] = {}
+        # Running throttle window per attribute id (throttle mode).
+        self._throttled: dict[int, WheelTimer] = {}
+        self._remove_listener = node.add_on_changed_listener(self._on_changed)
+
+    @property
+    def active(self) -> bool:
+        """Whether the subscription is still registered with its node."""
+        return self._remove_listener is not None
+
+    def cancel(self) -> None:
+        """Stop receiving updates and drop any pending ones."""
+        if self._remove_listener is None:
+            return
+
+        self._remove_listener()
+        self._remove_listener = None
+        self._pending.clear()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for timer in self._throttled.values():
+            timer.cancel()
+        self._throttled.clear()
+
+    def _matches(self, attribute: HomeeAttribute) -> bool:
+        if self.attribute_id is not None and attribute.id != self.attribute_id:
+            return False
+        if self.attribute_type is not None and attribute.type != self.attribute_type:
+            return False
+        return True
+
+    def _on_changed(self, node: HomeeNode, attribute: HomeeAttribute) -> None:
+        if not self._matches(attribute):
+            return
+
+        if self.mode == SubscriptionMode.IMMEDIATE:
+            self._call(attribute)
+        elif self.mode == SubscriptionMode.DEBOUNCE:
+            self._pending[attribute.id] = attribute
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = self._wheel.schedule(self.interval, self._flush)
+        elif self.mode == SubscriptionMode.THROTTLE:
+            if attribute.id not in self._throttled:
+                self._call(attribute)
+                self._throttled[attribute.id] = self._wheel.schedule(
+                    self.interval, self._throttled.pop, attribute.id
+                )
+        elif self.mode == SubscriptionMode.SAMPLE:
+            self._pending[attribute.id] = attribute
+            if self._timer is None:
+                self._timer = self._wheel.schedule(self.interval, self._flush)
+
+    def _flush(self) -> None:
+        self._timer = None
+        pending = list(self._pending.values())
+        self._pending.clear()
+        for attribute in pending:
+            self._call(attribute)
+
+    def _call(self, attribute: HomeeAttribute) -> None:
+        try:
+            self.listener(self.node, attribute)
+        except Exception:
+            _LOGGER.exception(
+                "Error in subscription listener for node %s attribute %s",
+                self.node.id,
+                attribute.id,
+            )
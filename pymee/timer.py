@@ -0,0 +1,143 @@
+"""Hashed timer wheel shared by many short-lived timeouts."""
+
+import asyncio
+from collections.abc import Callable
+import logging
+import math
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class WheelTimer:
+    """Handle for a callback scheduled on a TimerWheel."""
+
+    __slots__ = ("_wheel", "_slot", "_rounds", "_callback", "_args")
+
+    def __init__(self, wheel, slot: int, rounds: int, callback: Callable, args):
+        """Initialize the timer handle."""
+        self._wheel = wheel
+        self._slot = slot
+        self._rounds = rounds
+        self._callback = callback
+        self._args = args
+
+    @property
+    def active(self) -> bool:
+        """Whether the timer is still scheduled."""
+        return self._wheel is not None
+
+    def cancel(self) -> None:
+        """Cancel the timer. Does nothing if it already fired or was cancelled."""
+        if self._wheel is not None:
+            self._wheel._remove(self)
+            self._wheel = None
+
+
+class TimerWheel:
+    """Drive any number of timeouts from a single asyncio timer.
+
+    Timeouts are rounded up to the wheel's tick. Scheduling and cancelling
+    are O(1), and the wheel only keeps an asyncio timer while it has
+    pending timeouts.
+    """
+
+    def __init__(self, tick: float = 0.1, slots: int = 512) -> None:
+        """Initialize the wheel with the given tick length (in seconds) and size."""
+        self.tick = tick
+        self._slots: list[dict[WheelTimer, None]] = [{} for _ in range(slots)]
+        self._cursor = 0
+        self._count = 0
+        self._loop: asyncio.AbstractEventLoop = None
+        self._handle: asyncio.TimerHandle = None
+        self._origin = 0.0
+        self._ticks = 0
+        self._in_tick = False
+
+    def __len__(self) -> int:
+        """Return the number of pending timers."""
+        return self._count
+
+    def schedule(self, delay: float, callback: Callable, *args) -> WheelTimer:
+        """Call callback(*args) after delay seconds, rounded up to the next tick."""
+        if self._handle is not None or self._in_tick:
+            # The cursor is at the last processed tick, which may be a while ago.
+            delay += self._loop.time() - (self._origin + self._ticks * self.tick)
+        ticks = max(1, math.ceil(delay / self.tick))
+        size = len(self._slots)
+        slot = (self._cursor + ticks) % size
+        timer = WheelTimer(self, slot, (ticks - 1) // size, callback, args)
+        self._slots[slot][timer] = None
+        self._count += 1
+
+        if self._handle is None and not self._in_tick:
+            self._start()
+
+        return timer
+
+    def close(self) -> None:
+        """Cancel all pending timers and stop ticking."""
+        for slot in self._slots:
+            for timer in slot:
+                timer._wheel = None
+            slot.clear()
+        self._count = 0
+        self._stop()
+
+    def _remove(self, timer: WheelTimer) -> None:
+        del self._slots[timer._slot][timer]
+        self._count -= 1
+        if self._count == 0 and not self._in_tick:
+            self._stop()
+
+    def _start(self) -> None:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        self._origin = self._loop.time()
+        self._ticks = 0
+        self._handle = self._loop.call_at(self._origin + self.tick, self._on_tick)
+
+    def _stop(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _on_tick(self) -> None:
+        # Catch up on ticks we missed while the loop was busy.
+        due = int((self._loop.time() - self._origin) / self.tick)
+        self._in_tick = True
+        try:
+            while self._ticks < due and self._count > 0:
+                self._ticks += 1
+                self._cursor = (self._cursor + 1) % len(self._slots)
+                self._advance(self._slots[self._cursor])
+        finally:
+            self._in_tick = False
+
+        if self._count == 0:
+            self._handle = None
+            return
+
+        self._handle = self._loop.call_at(
+            self._origin + (self._ticks + 1) * self.tick, self._on_tick
+        )
+
+    def _advance(self, slot: dict[WheelTimer, None]) -> None:
+        expired = []
+        for timer in slot:
+            if timer._rounds > 0:
+                timer._rounds -= 1
+            else:
+                expired.append(timer)
+
+        for timer in expired:
+            # An earlier callback may have cancelled this timer already.
+            if timer._wheel is None:
+                continue
+
+            del slot[timer]
+            self._count -= 1
+            timer._wheel = None
+            try:
+                timer._callback(*timer._args)
+            except Exception:
+                _LOGGER.exception("Error in timer callback %s", timer._callback)
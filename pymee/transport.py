@@ -0,0 +1,65 @@
+"""Tuning of the websocket transport."""
+
+from websockets.extensions.permessage_deflate import ClientPerMessageDeflateFactory
+
+
+class TransportConfig:
+    """Settings passed to websockets.connect() when opening the connection.
+
+    compression enables permessage-deflate. max_window_bits (9-15) and
+    no_context_takeover ask homee to compress with a smaller window or
+    without keeping a context between messages, which needs less memory per
+    connection at the cost of more bytes. max_size limits the size of a single
+    incoming message (None for no limit), max_queue the number of received
+    messages that are buffered before reading from the socket pauses, and
+    write_limit is the high-water mark (or a (high, low) tuple) of the write
+    buffer.
+    """
+
+    def __init__(
+        self,
+        compression: bool = True,
+        max_window_bits: int | None = None,
+        no_context_takeover: bool = False,
+        max_size: int | None = 64 * 2**20,
+        max_queue: int | None = 16,
+        write_limit: int | tuple[int, int | None] = 32 * 2**10,
+        close_timeout: float | None = 10,
+    ) -> None:
+        """Initialize the config. The default max_size fits the 'all' message of large installations."""
+        self.compression = compression
+        self.max_window_bits = max_window_bits
+        self.no_context_takeover = no_context_takeover
+        self.max_size = max_size
+        self.max_queue = max_queue
+        self.write_limit = write_limit
+        self.close_timeout = close_timeout
+
+    def connect_kwargs(self) -> dict:
+        """Return the keyword arguments for websockets.connect()."""
+        kwargs = {
+            "max_size": self.max_size,
+            "max_queue": self.max_queue,
+            "write_limit": self.write_limit,
+            "close_timeout": self.close_timeout,
+        }
+        if not self.compression:
+            kwargs["compression"] = None
+        elif self.max_window_bits is not None or self.no_context_takeover:
+            kwargs["extensions"] = [
+                ClientPerMessageDeflateFactory(
+                    server_no_context_takeover=self.no_context_takeover,
+                    server_max_window_bits=self.max_window_bits,
+                )
+            ]
+        return kwargs
+
+    def __repr__(self) -> str:
+        """Return a readable representation."""
+        return (
+            f"TransportConfig(compression={self.compression}, "
+            f"max_window_bits={self.max_window_bits}, "
+            f"no_context_takeover={self.no_context_takeover}, "
+            f"max_size={self.max_size}, max_queue={self.max_queue}, "
+            f"write_limit={self.write_limit}, close_timeout={self.close_timeout})"
+        )
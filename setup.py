@@ -13,7 +13,7 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/FreshlyBrewedCode/pymee",
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=["benchmarks*", "tests*"]),
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
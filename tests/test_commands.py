@@ -0,0 +1,30 @@
+"""Tests of sending commands."""
+
+import asyncio
+
+from pymee import Homee
+
+
+class SendingHomee(Homee):
+    def __init__(self) -> None:
+        super().__init__("127.0.0.1", "user", "password")
+        self.sent = []
+
+    async def send(self, msg, *args, **kwargs):
+        self.sent.append((msg, kwargs.get("key")))
+        await super().send(msg, *args, **kwargs)
+
+
+def test_commands_go_through_send():
+    homee = SendingHomee()
+
+    async def run():
+        await homee.set_value(1, 2, 1)
+        await homee.set_values([(3, 4, 0), (5, 6, 1)])
+
+    asyncio.run(run())
+    assert homee.sent == [
+        ("PUT:/nodes/1/attributes/2?target_value=1", (1, 2)),
+        ("PUT:/nodes/3/attributes/4?target_value=0", (3, 4)),
+        ("PUT:/nodes/5/attributes/6?target_value=1", (5, 6)),
+    ]
@@ -0,0 +1,25 @@
+"""Tests of event filters."""
+
+from pymee.events import EventFilter, HomeeEvent
+
+
+def test_node_filter_matches_single_messages():
+    event_filter = EventFilter(node_ids=[5])
+
+    assert event_filter.matches(HomeeEvent.from_message("node", {"node": {"id": 5}}))
+    assert not event_filter.matches(
+        HomeeEvent.from_message("attribute", {"attribute": {"node_id": 6, "type": 1}})
+    )
+    assert not event_filter.matches(HomeeEvent.from_message("groups", {"groups": []}))
+
+
+def test_node_filter_matches_bulk_messages_containing_a_node():
+    event_filter = EventFilter(node_ids=[5])
+    nodes = {"nodes": [{"id": 4}, {"id": 5}]}
+
+    assert event_filter.matches(HomeeEvent.from_message("nodes", nodes))
+    assert event_filter.matches(HomeeEvent.from_message("all", {"all": nodes}))
+    assert not event_filter.matches(
+        HomeeEvent.from_message("nodes", {"nodes": [{"id": 4}]})
+    )
+    assert not event_filter.matches(HomeeEvent.from_message("all", {"all": {}}))
@@ -0,0 +1,38 @@
+"""Tests of the fake homee server."""
+
+import asyncio
+import copy
+import itertools
+
+from pymee.fake_server import FakeHomeeServer
+from pymee.generator import HomeGenerator
+
+
+def test_replayed_updates_keep_the_previous_value():
+    home = HomeGenerator(5, seed=1)
+    data = home.all()
+    values = {
+        attribute["id"]: attribute["current_value"]
+        for node in copy.deepcopy(data)["nodes"]
+        for attribute in node["attributes"]
+    }
+    stream = itertools.islice(home.update_stream(), 200)
+    updates = ((0.0, msg) for _, msg in stream)
+
+    async def run():
+        server = FakeHomeeServer(data, updates=updates)
+        sent = []
+
+        async def broadcast(msg):
+            sent.append(dict(msg["attribute"]))
+
+        server.broadcast = broadcast
+        async with server:
+            while len(sent) < 200:
+                await asyncio.sleep(0.01)
+        return sent
+
+    sent = asyncio.run(asyncio.wait_for(run(), 10))
+    for attribute in sent:
+        assert attribute["last_value"] == values[attribute["id"]]
+        values[attribute["id"]] = attribute["current_value"]
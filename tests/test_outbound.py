@@ -0,0 +1,77 @@
+"""Tests of the send queue and the rate limiter."""
+
+import asyncio
+
+import pytest
+
+from pymee import Homee
+from pymee.fake_server import FakeHomeeServer
+from pymee.generator import HomeGenerator
+from pymee.outbound import Priority, PriorityMessageQueue, RateLimiter
+
+
+def test_reserved_message_is_sent_before_later_higher_priorities():
+    async def run():
+        queue = PriorityMessageQueue()
+        queue.put_nowait("background", Priority.BACKGROUND)
+        assert queue.reserve() == "background"
+
+        queue.put_nowait("interactive", Priority.INTERACTIVE)
+        assert queue.reserve() == "background"
+        assert queue.peek() == "background"
+        assert queue.qsize() == 2
+        return [queue.get_nowait(), queue.get_nowait()]
+
+    assert asyncio.run(run()) == ["background", "interactive"]
+
+
+def test_throttle_wait_is_recorded_while_messages_arrive():
+    async def run():
+        home = HomeGenerator(20, seed=1)
+        async with FakeHomeeServer(home.all(), update_rate=300) as server:
+            limiter = RateLimiter(rate=20, burst=1)
+            homee = Homee(
+                "127.0.0.1",
+                server.user,
+                server.password,
+                port=server.port,
+                rate_limiter=limiter,
+            )
+            async with homee:
+                await asyncio.sleep(0.1)
+                throttled = limiter.wait_seconds
+                for _ in range(10):
+                    await homee.send("GET:/settings/")
+                while homee._message_queue.qsize():
+                    await asyncio.sleep(0.01)
+                return limiter.wait_seconds - throttled
+
+    # Every message waits 50 ms for the bucket to refill.
+    assert asyncio.run(run()) >= 0.4
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"rate": 0},
+        {"rate": -1},
+        {"burst": 0},
+        {"protocol_limits": {1: (0, 5)}},
+        {"protocol_limits": {1: (2, 0)}},
+    ],
+)
+def test_rate_limiter_rejects_invalid_limits(kwargs):
+    with pytest.raises(ValueError):
+        RateLimiter(**kwargs)
+
+
+def test_node_protocol_follows_added_nodes():
+    home = HomeGenerator(3, seed=1)
+    homee = Homee("127.0.0.1", "user", "password")
+    nodes = home.all()["nodes"]
+    homee._update_or_create_node(nodes[0])
+    assert homee._node_protocol(nodes[0]["id"]) == nodes[0]["protocol"]
+    assert homee._node_protocol(nodes[1]["id"]) is None
+
+    homee._update_or_create_node(nodes[1])
+    assert homee._node_protocol(nodes[1]["id"]) == nodes[1]["protocol"]
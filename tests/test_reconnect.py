@@ -0,0 +1,31 @@
+"""Tests of reconnecting after the connection died."""
+
+import asyncio
+
+from pymee import Homee, ReconnectPolicy
+from pymee.fake_server import FakeHomeeServer
+from pymee.generator import HomeGenerator
+
+
+def test_silent_peer_uses_up_the_retries():
+    async def run():
+        async with FakeHomeeServer(HomeGenerator(2, seed=1).all()) as server:
+            policy = ReconnectPolicy(initial_delay=0.05, jitter=False, max_retries=3)
+            homee = Homee(
+                "127.0.0.1",
+                server.user,
+                server.password,
+                port=server.port,
+                ping_interval=0.1,
+                reconnect_policy=policy,
+            )
+            task = homee.start()
+            await homee.wait_until_connected()
+            # Accepts new connections but never answers on them.
+            server.freeze()
+            await asyncio.wait_for(task, 10)
+            return homee.retries, server.connections
+
+    retries, connections = asyncio.run(run())
+    assert retries == 3
+    assert connections == 3
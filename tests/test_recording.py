@@ -0,0 +1,38 @@
+"""Tests of recording websocket traffic."""
+
+import asyncio
+
+from pymee import Homee
+from pymee.fake_server import FakeHomeeServer
+from pymee.generator import HomeGenerator
+from pymee.recording import INCOMING, OUTGOING, TrafficRecorder, read_recording
+
+
+def test_record_traffic_of_a_running_connection(tmp_path):
+    path = str(tmp_path / "traffic.rec")
+
+    async def run():
+        async with FakeHomeeServer(HomeGenerator(5, seed=1).all()) as server:
+            homee = Homee("127.0.0.1", server.user, server.password, port=server.port)
+            with TrafficRecorder(path) as recorder:
+                recorder.attach(homee)
+                async with homee:
+                    node = homee.nodes[0]
+                    attribute = node.attributes[0]
+                    await homee.set_value(node.id, attribute.id, 1)
+                    await homee.update_node(node.id)
+                return node.id, attribute.id
+
+    node_id, attribute_id = asyncio.run(run())
+    frames = list(read_recording(path))
+    outgoing = [frame.data for frame in frames if frame.direction == OUTGOING]
+
+    assert outgoing == [
+        "GET:all",
+        f"PUT:/nodes/{node_id}/attributes/{attribute_id}?target_value=1",
+        f"GET:/nodes/{node_id}/",
+    ]
+    assert any(
+        frame.direction == INCOMING and frame.data.startswith('{"all"')
+        for frame in frames
+    )
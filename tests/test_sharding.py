@@ -0,0 +1,81 @@
+"""Tests of the sharded runner."""
+
+import asyncio
+
+from pymee.fake_server import FakeHomeeServer
+from pymee.generator import HomeGenerator
+from pymee.sharding import HashRing, ShardedRunner, _decode, _encode
+
+
+def test_hash_ring_only_moves_keys_of_a_removed_shard():
+    ring = HashRing()
+    for shard in range(4):
+        ring.add(shard)
+    keys = [f"cube-{i}" for i in range(200)]
+    before = {key: ring.get(key) for key in keys}
+    assert set(before.values()) == {0, 1, 2, 3}
+
+    ring.remove(2)
+    after = {key: ring.get(key) for key in keys}
+    assert 2 not in after.values()
+    assert all(after[key] == shard for key, shard in before.items() if shard != 2)
+
+
+def test_frames_survive_encoding():
+    frame = (0, "cube", "attribute", {"id": 1, "current_value": 2.5, "data": None})
+    assert _decode(_encode(*frame)) == frame
+
+
+class _Runner(ShardedRunner):
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.all_messages: dict[str, int] = {}
+        self.died: list[tuple[int, list[str]]] = []
+
+    async def on_event(self, key, event):
+        if event.type == "all":
+            self.all_messages[key] = self.all_messages.get(key, 0) + 1
+
+    async def on_worker_died(self, index, keys):
+        self.died.append((index, keys))
+
+
+async def _wait_for(condition, timeout: float = 30.0):
+    async def wait():
+        while not condition():
+            await asyncio.sleep(0.05)
+
+    await asyncio.wait_for(wait(), timeout)
+
+
+def test_cubes_of_a_dead_worker_move_to_the_remaining_workers():
+    async def run():
+        async with FakeHomeeServer(HomeGenerator(3, seed=1).all()) as server:
+            # Starting a worker process takes a while, don't count it as a hang.
+            runner = _Runner(
+                workers=2, health_interval=0.2, health_timeout=10, port=server.port
+            )
+            keys = [f"cube-{i}" for i in range(6)]
+            for key in keys:
+                runner.add(key, "127.0.0.1", server.user, server.password)
+            await runner.start()
+            workers = list(runner._workers.values())
+            try:
+                await _wait_for(lambda: set(runner.all_messages) == set(keys))
+                index = runner.shard_of(keys[0])
+                moved = [key for key in keys if runner.shard_of(key) == index]
+
+                runner._workers[index].process.kill()
+                await _wait_for(lambda: runner.died)
+                assert runner.died == [(index, moved)]
+                assert all(runner.shard_of(key) != index for key in keys)
+                await _wait_for(
+                    lambda: all(runner.all_messages[key] == 2 for key in moved)
+                )
+            finally:
+                await runner.stop()
+            return runner, workers
+
+    runner, workers = asyncio.run(run())
+    assert not runner._workers
+    assert all(worker.commands.closed and worker.events.closed for worker in workers)
@@ -0,0 +1,57 @@
+"""Tests of parsing the 'all' message in chunks."""
+
+import json
+
+import pytest
+
+from pymee.generator import HomeGenerator
+from pymee.streaming import AllMessageParser
+
+MESSAGES = [
+    '{"all": {"x": 12345, "y": true, "nodes": [{"id": 1, "v": 2.5}], "z": 7}}',
+    '{ "all" : { "a" : -1.5e3 , "nodes" : [ ] , "b" : null , "c" : [1, 2] } }',
+    json.dumps({"all": HomeGenerator(3, seed=1).all()}),
+]
+
+
+def parse(msg: str, size: int) -> tuple[AllMessageParser, list]:
+    parser = AllMessageParser()
+    items = []
+    for start in range(0, len(msg), size):
+        parser.feed(msg[start : start + size])
+        items.extend(parser)
+    parser.close()
+    items.extend(parser)
+    return parser, items
+
+
+@pytest.mark.parametrize("msg", MESSAGES)
+def test_feed_in_chunks_of_every_size(msg):
+    expected = json.loads(msg)["all"]
+    for size in range(1, len(msg) + 1):
+        parser, items = parse(msg, size)
+        assert parser.done, size
+        assert parser.data == expected, size
+        nodes = [value for key, value in items if key == "node"]
+        assert nodes == expected["nodes"], size
+
+
+def test_complete_message():
+    msg = MESSAGES[0]
+    parser = AllMessageParser(msg)
+    assert list(parser) == [
+        ("x", 12345),
+        ("y", True),
+        ("node", {"id": 1, "v": 2.5}),
+        ("z", 7),
+    ]
+    assert parser.data == json.loads(msg)["all"]
+
+
+def test_incomplete_message():
+    parser = AllMessageParser()
+    parser.feed('{"all": {"x": 1, "nodes": [{"id": 1}')
+    list(parser)
+    parser.close()
+    with pytest.raises(ValueError):
+        list(parser)
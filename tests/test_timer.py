@@ -0,0 +1,41 @@
+"""Tests of the timer wheel."""
+
+import asyncio
+
+from pymee.timer import TimerWheel
+
+
+def test_schedule_in_the_middle_of_a_tick_does_not_fire_early():
+    async def run():
+        loop = asyncio.get_running_loop()
+        wheel = TimerWheel(tick=0.05)
+        fired = []
+        # Keep the wheel ticking, so the timers below are scheduled mid-tick.
+        wheel.schedule(1.0, lambda: None)
+        await asyncio.sleep(0.07)
+
+        delays = (0.01, 0.05, 0.1, 0.125)
+        scheduled_at = loop.time()
+        for delay in delays:
+            wheel.schedule(delay, lambda d: fired.append((d, loop.time())), delay)
+        await asyncio.sleep(0.3)
+        wheel.close()
+        return scheduled_at, fired
+
+    scheduled_at, fired = asyncio.run(run())
+    assert len(fired) == 4
+    for delay, fired_at in fired:
+        assert fired_at - scheduled_at >= delay
+
+
+def test_cancelled_timer_does_not_fire():
+    async def run():
+        wheel = TimerWheel(tick=0.01)
+        fired = []
+        timer = wheel.schedule(0.02, fired.append, 1)
+        wheel.schedule(0.02, fired.append, 2)
+        timer.cancel()
+        await asyncio.sleep(0.06)
+        return fired, len(wheel)
+
+    assert asyncio.run(run()) == ([2], 0)